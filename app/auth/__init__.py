@@ -1 +0,0 @@
-# Auth package
@@ -3,6 +3,7 @@ Authentication module - JWT token validation and user authentication
 """
 
 from functools import wraps
+from typing import Annotated
 from fastapi import HTTPException, Request, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
@@ -10,16 +11,33 @@ from app.services.keycloak_service import keycloak_service
 
 security = HTTPBearer()
 
+def get_fe_roles(user: dict):
+    """
+    Return the user's benyon_fe client roles, or () if the token has none
+    """
+    try:
+        return user["resource_access"]["benyon_fe"]["roles"]
+    except KeyError:
+        return ()
+
 async def jwt_required(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
     """
     Dependency to validate JWT token and return user info
     """
     try:
         token = credentials.credentials
-        user_info, permissions = await keycloak_service.verify_token(token)
+        user_info = await keycloak_service.verify_claims(token)
         
-        # Add permissions to user info
-        user_info["permissions"] = permissions
+        # Precompute role/permission sets once per request for O(1) checks
+        realm_roles = user_info.get("realm_access", {}).get("roles", ())
+        client_roles = (
+            role
+            for access in user_info.get("resource_access", {}).values()
+            for role in access.get("roles", ())
+        )
+        user_info["_roles"] = frozenset(realm_roles).union(client_roles)
+        user_info["_fe_roles"] = get_fe_roles(user_info)
+        user_info["_fe_roles_set"] = frozenset(user_info["_fe_roles"])
         
         return user_info
     
@@ -30,6 +48,37 @@ async def jwt_required(credentials: HTTPAuthorizationCredentials = Depends(secur
             headers={"WWW-Authenticate": "Bearer"}
         )
 
+async def permissions_required(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    current_user: dict = Depends(jwt_required)
+) -> dict:
+    """
+    Dependency like jwt_required that also resolves the user's UMA resource permissions.
+    Only endpoints that check resource permissions should pay for the extra Keycloak call.
+    """
+    permissions = await keycloak_service.get_uma_permissions(credentials.credentials)
+    current_user["permissions"] = permissions
+    current_user["_permissions"] = frozenset(permissions)
+    
+    return current_user
+
+async def require_admin(current_user: dict = Depends(jwt_required)) -> dict:
+    """
+    Dependency that validates the JWT and requires the benyon_fe admin role
+    """
+    if "admin" not in current_user["_fe_roles_set"]:
+        raise HTTPException(status_code=403, detail="Admin role required for this operation")
+    
+    return current_user
+
+async def get_user_scopes(current_user: dict = Depends(permissions_required)) -> tuple[frozenset, frozenset]:
+    """
+    Dependency returning the user's (permissions, benyon_fe roles) sets
+    """
+    return current_user["_permissions"], current_user["_fe_roles_set"]
+
+UserScopes = Annotated[tuple[frozenset, frozenset], Depends(get_user_scopes)]
+
 def require_role(required_role: str):
     """
     Decorator to require specific role for endpoint access
@@ -42,16 +91,8 @@ def require_role(required_role: str):
             if not current_user:
                 raise HTTPException(status_code=401, detail="Authentication required")
             
-            # Check if user has required role
-            user_roles = current_user.get("realm_access", {}).get("roles", [])
-            client_roles = []
-            
-            # Get client roles
-            resource_access = current_user.get("resource_access", {})
-            for client, access in resource_access.items():
-                client_roles.extend(access.get("roles", []))
-            
-            all_roles = user_roles + client_roles
+            # Check if user has required role (realm + client roles, set by jwt_required)
+            all_roles = current_user["_roles"]
             
             if required_role not in all_roles and "admin" not in all_roles:
                 raise HTTPException(
@@ -65,7 +106,8 @@ def require_role(required_role: str):
 
 def require_permission(required_permission: str):
     """
-    Decorator to require specific permission for endpoint access
+    Decorator to require specific permission for endpoint access.
+    The endpoint must depend on permissions_required, not jwt_required.
     """
     def decorator(func):
         @wraps(func)
@@ -74,7 +116,7 @@ def require_permission(required_permission: str):
             if not current_user:
                 raise HTTPException(status_code=401, detail="Authentication required")
             
-            permissions = current_user.get("permissions", [])
+            permissions = current_user.get("_permissions", frozenset())
             
             if required_permission not in permissions and "api_all_endpoints" not in permissions:
                 raise HTTPException(
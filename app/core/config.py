@@ -1,4 +1,5 @@
 import os
+from pathlib import Path
 from decouple import config
 
 # Base directory
@@ -15,11 +16,30 @@ PORT = config("PORT", default=8000, cast=int)
 ENVIRONMENT = config("ENVIRONMENT", default="development")
 DEBUG = config("DEBUG", default=True if ENVIRONMENT == "development" else False, cast=bool)
 
+# Server worker processes, and document-render processes per server worker.
+# By default the render pools of all workers together get one process per CPU.
+WEB_CONCURRENCY = config("WEB_CONCURRENCY", default=1 if DEBUG else (os.cpu_count() or 1), cast=int)
+RENDER_WORKERS = config("RENDER_WORKERS", default=max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY), cast=int)
+
 # File Storage Paths
-DATA_DIR = os.path.join(BASE_DIR, "data")
-REMOTE_DIR = os.path.join(DATA_DIR, "remote")
-BACKUP_DIR = os.path.join(DATA_DIR, "backup")
-PREVIEW_DIR = os.path.join(DATA_DIR, "preview")
+DATA_DIR = Path(BASE_DIR) / "data"
+REMOTE_DIR = DATA_DIR / "remote"
+BACKUP_DIR = DATA_DIR / "backup"
+PREVIEW_DIR = DATA_DIR / "preview"
+
+# Uploads are read and written in blocks of this size
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1 MiB
+
+# zlib level for FileService's PDF page preview PNGs: fastest encode for slightly larger output
+PNG_COMPRESS_LEVEL = 1
+
+# Hand file downloads to nginx via X-Accel-Redirect instead of streaming them from Python.
+# X_ACCEL_PREFIX must match an `internal` nginx location aliased to the remote directory.
+USE_X_ACCEL_REDIRECT = config("USE_X_ACCEL_REDIRECT", default=False, cast=bool)
+X_ACCEL_PREFIX = config("X_ACCEL_PREFIX", default="/internal/")
+
+# Shared state for multi-worker deployments (rate limiting); in-process fallback when empty
+REDIS_URL = config("REDIS_URL", default="")
 
 # CORS Configuration
 CORS_ORIGINS = [
@@ -31,7 +51,7 @@ CORS_ORIGINS = [
     "https://auth.yourdomain.com",
 ]
 
-# Ensure directories exist
-os.makedirs(REMOTE_DIR, exist_ok=True)
-os.makedirs(BACKUP_DIR, exist_ok=True)
-os.makedirs(PREVIEW_DIR, exist_ok=True)
+def ensure_dirs():
+    """Create the file storage directories; called at application startup, not import"""
+    for directory in (REMOTE_DIR, BACKUP_DIR, PREVIEW_DIR):
+        directory.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,41 @@
+"""
+Executors - shared process pool for CPU-bound document rendering
+"""
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from app.core.config import RENDER_WORKERS
+
+_process_pool = None
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """
+    Return the shared process pool, creating it on first use.
+    Workers are spawned rather than forked so they never inherit the event loop
+    or the logging/threadpool threads of the server process.
+    """
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(
+            max_workers=RENDER_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _process_pool
+
+async def run_in_process(func, *args):
+    """
+    Run func(*args) in the shared process pool without blocking the event loop.
+    func must be a top-level (picklable) function, and its arguments, results and
+    exceptions must be picklable too; raise plain exceptions rather than HTTPException.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_process_pool(), func, *args)
+
+def shutdown_process_pool() -> None:
+    """Stop the shared process pool, dropping queued work"""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(cancel_futures=True)
+        _process_pool = None
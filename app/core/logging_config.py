@@ -0,0 +1,31 @@
+"""
+Logging configuration - queue-backed handlers so log I/O stays off the event loop
+"""
+
+import logging
+import logging.handlers
+import queue
+
+from app.core.config import DEBUG
+
+LOG_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """
+    Route the application's loggers through a QueueHandler.
+    Records are formatted and written by a QueueListener thread; the caller
+    must stop() the returned listener on shutdown to flush pending records.
+    """
+    log_queue = queue.SimpleQueue()
+    
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    app_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    app_logger.propagate = False
+    
+    listener.start()
+    return listener
@@ -0,0 +1,47 @@
+"""
+Middleware - response compression limited to text payloads
+"""
+
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder, IdentityResponder
+
+# Only these media types are worth gzipping; PDFs, images and office files are already compressed
+COMPRESSIBLE_CONTENT_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "text/",
+)
+
+
+class _TextGZipResponder(GZipResponder):
+    """GZipResponder that passes through file, partial and non-text responses untouched"""
+
+    async def send_with_compression(self, message) -> None:
+        await super().send_with_compression(message)
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            # FileResponse advertises accept-ranges; those bodies keep their Content-Length
+            # (sendfile) and Range requests must get byte offsets into the uncompressed file
+            if (
+                message["status"] == 206
+                or "accept-ranges" in headers
+                or not headers.get("content-type", "").startswith(COMPRESSIBLE_CONTENT_TYPES)
+            ):
+                self.content_type_is_excluded = True
+
+
+class TextGZipMiddleware(GZipMiddleware):
+    """GZipMiddleware that only compresses JSON, HTML and other text responses"""
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        if "gzip" in Headers(scope=scope).get("Accept-Encoding", ""):
+            responder = _TextGZipResponder(self.app, self.minimum_size, compresslevel=self.compresslevel)
+        else:
+            responder = IdentityResponder(self.app, self.minimum_size)
+
+        await responder(scope, receive, send)
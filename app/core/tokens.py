@@ -0,0 +1,83 @@
+"""
+Tokens - local verification of Keycloak access tokens and caching of per-token results
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from jwcrypto import jwk
+from jwcrypto.jwt import JWTMissingKey
+
+# Minimum time between JWKS re-fetches triggered by an unknown key id
+JWKS_REFRESH_INTERVAL = 60  # seconds
+
+# Verified tokens are reused for at most this long (and never past their exp)
+TOKEN_CACHE_TTL = 30  # seconds
+TOKEN_CACHE_MAXSIZE = 10_000
+
+
+class TokenCache:
+    """LRU of per-token values; each entry lives until the token's exp or TOKEN_CACHE_TTL, whichever is first"""
+
+    def __init__(self, maxsize: int = TOKEN_CACHE_MAXSIZE):
+        self.maxsize = maxsize
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        """Short fixed-size cache key for a raw token, so raw tokens are never held in memory"""
+        return hashlib.blake2b(token.encode(), digest_size=16).digest()
+
+    def get(self, key: bytes):
+        """Return a cached value that has not expired yet, else None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def expires_at(self, key: bytes):
+        """Expiry time of the entry for key, or None if there is none"""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key: bytes, value, exp: float) -> None:
+        """Store a value until exp or the TTL, evicting the least recently used entry past maxsize"""
+        self._entries[key] = (min(exp, time.time() + TOKEN_CACHE_TTL), value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+
+class JWKSVerifier:
+    """Verifies token signatures offline with the realm JWKS, fetched on first use and refreshed on kid miss"""
+
+    def __init__(self, keycloak_openid):
+        self.keycloak_openid = keycloak_openid
+        self._jwks = None
+        self._jwks_fetched_at = 0.0
+
+    async def _load_jwks(self):
+        """Fetch the realm's signing keys from Keycloak"""
+        certs = await self.keycloak_openid.a_certs()
+        self._jwks = jwk.JWKSet.from_json(json.dumps(certs))
+        self._jwks_fetched_at = time.time()
+        return self._jwks
+
+    async def decode(self, token: str) -> dict:
+        """Verify the token signature locally against the cached JWKS and return its claims"""
+        jwks = self._jwks or await self._load_jwks()
+        try:
+            return await self.keycloak_openid.a_decode_token(token, validate=True, key=jwks)
+        except JWTMissingKey:
+            # Unknown kid: Keycloak may have rotated keys. Throttle re-fetches so
+            # forged kids can't turn every request into a JWKS download.
+            if time.time() - self._jwks_fetched_at < JWKS_REFRESH_INTERVAL:
+                raise
+            jwks = await self._load_jwks()
+            return await self.keycloak_openid.a_decode_token(token, validate=True, key=jwks)
@@ -3,17 +3,18 @@ Files Router - Clean, optimized file management endpoints
 Handles upload, download, preview, and file operations with proper authentication
 """
 
-import traceback
+import logging
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Form
-from fastapi.responses import FileResponse, JSONResponse
-from typing import List, Optional
+from fastapi.responses import FileResponse, ORJSONResponse
+from typing import Any, List, Optional
+from pydantic import BaseModel, ConfigDict
 import os
 import shutil
 from datetime import datetime
 from pathlib import Path
 
 from app.core.config import REMOTE_DIR, BACKUP_DIR, PREVIEW_DIR
-from app.core.auth import jwt_required
+from app.core.auth import jwt_required, require_admin, UserScopes
 from app.services.file_service import FileService
 from app.routers.utils.api_files_utils import (
     search_files, download_file, delete_file_and_dir, create_dir, 
@@ -24,31 +25,52 @@ from app.routers.utils.api_files_utils import (
     get_pptx_info, get_pptx_slide, get_newly_added_files_since_timestamp,
     get_newly_added_files
 )
+from app.routers.utils.misc_files_utils import REMOTE_BASE_DIR
 
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+router = APIRouter(default_response_class=ORJSONResponse)
 file_service = FileService()
 
+REMOTE_ROOT = Path(REMOTE_BASE_DIR).resolve()
+
+
+async def safe_path(path: str = Form(...)) -> str:
+    """
+    Canonicalize a form path once per request.
+    Returns the path relative to the remote root; rejects paths that escape it.
+    """
+    resolved = (REMOTE_ROOT / path.lstrip("/\\")).resolve()
+    if resolved != REMOTE_ROOT and REMOTE_ROOT not in resolved.parents:
+        raise HTTPException(status_code=400, detail="Invalid path")
+    return resolved.relative_to(REMOTE_ROOT).as_posix()
+
+
+class DetailResponse(BaseModel):
+    """Envelope returned by the JSON file endpoints"""
+    model_config = ConfigDict(extra="forbid")
+    
+    detail: Any
+
+
 # Modern FastAPI endpoints with proper authentication
-@router.post("/upload")
+@router.post("/upload", response_model=DetailResponse)
 async def upload_files_endpoint(
     files: List[UploadFile] = File(...),
     folder: Optional[str] = Form(None),
     path: Optional[str] = Form(None),
-    current_user: dict = Depends(jwt_required)
+    current_user: dict = Depends(require_admin)
 ):
     """Upload multiple files with validation"""
     try:
-        # Check for admin role for uploads
-        user_roles = current_user.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
-        if "admin" not in user_roles:
-            raise HTTPException(status_code=403, detail="Admin role required for file uploads")
-        
         uploaded_files = await upload_files(folder, files, path or "")
-        return JSONResponse(content={"detail": uploaded_files})
+        return {"detail": uploaded_files}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/search")
+@router.post("/search", response_model=DetailResponse)
 async def search_files_endpoint(
     search_str: str = Form(...),
     current_user: dict = Depends(jwt_required)
@@ -56,13 +78,15 @@ async def search_files_endpoint(
     """Search files by name"""
     try:
         results = await search_files(search_str)
-        return JSONResponse(content={"detail": results})
+        return {"detail": results}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/download_file")
 async def download_file_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     current_user: dict = Depends(jwt_required)
 ):
     """Download a specific file"""
@@ -72,89 +96,78 @@ async def download_file_endpoint(
         
         file_response = await download_file(path, user_id, username)
         return file_response
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.delete("/delete")
+@router.delete("/delete", response_model=DetailResponse)
 async def delete_file_endpoint(
-    path: str = Form(...),
-    current_user: dict = Depends(jwt_required)
+    path: str = Depends(safe_path),
+    current_user: dict = Depends(require_admin)
 ):
     """Delete a file or directory"""
     try:
-        # Check for admin role
-        user_roles = current_user.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
-        if "admin" not in user_roles:
-            raise HTTPException(status_code=403, detail="Admin role required for deletion")
-        
         result = await delete_file_and_dir(path)
-        return JSONResponse(content={"detail": result})
+        return {"detail": result}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/create_dir")
+@router.post("/create_dir", response_model=DetailResponse)
 async def create_directory_endpoint(
-    path: str = Form(...),
-    current_user: dict = Depends(jwt_required)
+    path: str = Depends(safe_path),
+    current_user: dict = Depends(require_admin)
 ):
     """Create a new directory"""
     try:
-        # Check for admin role
-        user_roles = current_user.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
-        if "admin" not in user_roles:
-            raise HTTPException(status_code=403, detail="Admin role required for directory creation")
-        
         relative_path = await create_dir(path)
-        return JSONResponse(content={"detail": f"directory created: {relative_path}"})
+        return {"detail": f"directory created: {relative_path}"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/dir_contents")
+@router.post("/dir_contents", response_model=DetailResponse)
 async def directory_contents_endpoint(
-    path: str = Form(...),
-    current_user: dict = Depends(jwt_required)
+    scopes: UserScopes,
+    path: str = Depends(safe_path)
 ):
     """Get directory contents with permissions"""
     try:
-        permissions = current_user.get("permissions", [])
-        roles = current_user.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
-        
+        permissions, roles = scopes
         results = await dir_contents(path, permissions, roles)
-        return JSONResponse(content={"detail": results})
-    except HTTPException as he:
-        raise he
+        return {"detail": results}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error retrieving dir contents of {path}: {tb_str}")
+        logger.exception("Error retrieving dir contents of %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/file_preview")
+@router.post("/file_preview", response_model=DetailResponse)
 async def file_preview_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     current_user: dict = Depends(jwt_required)
 ):
     """Generate file preview"""
     try:
         preview_img = await file_preview(path)
-        return JSONResponse(content={"detail": preview_img})
+        return {"detail": preview_img}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error processing file {path}: {tb_str}")
+        logger.exception("Error processing file %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/upload_multiple")
+@router.post("/upload_multiple", response_model=DetailResponse)
 async def upload_multiple_folders_endpoint(
     files: List[UploadFile] = File(...),
     directory_structure: str = Form(...),
-    current_user: dict = Depends(jwt_required)
+    current_user: dict = Depends(require_admin)
 ):
     """Upload multiple folders with complex directory structures"""
     try:
-        # Check for admin role
-        user_roles = current_user.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
-        if "admin" not in user_roles:
-            raise HTTPException(status_code=403, detail="Admin role required for bulk uploads")
-        
         if not directory_structure:
             raise HTTPException(status_code=400, detail="directory_structure field is required")
         
@@ -162,32 +175,32 @@ async def upload_multiple_folders_endpoint(
             raise HTTPException(status_code=400, detail="No files uploaded")
         
         result = await upload_multiple_folders(files, directory_structure)
-        return JSONResponse(content={"detail": result})
-    except HTTPException as he:
-        raise he
+        return {"detail": result}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error in upload_multiple endpoint: {tb_str}")
+        logger.exception("Error in upload_multiple endpoint")
         raise HTTPException(status_code=500, detail=str(e))
 
 # PDF-specific endpoints
-@router.post("/pdf_info")
+@router.post("/pdf_info", response_model=DetailResponse)
 async def pdf_info_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     current_user: dict = Depends(jwt_required)
 ):
     """Get PDF metadata"""
     try:
         pdf_info = await get_pdf_info(path)
-        return JSONResponse(content={"detail": pdf_info})
+        return {"detail": pdf_info}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting PDF info for {path}: {tb_str}")
+        logger.exception("Error getting PDF info for %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/pdf_page")
+@router.post("/pdf_page", response_model=DetailResponse)
 async def pdf_page_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     page: int = Form(1),
     quality: str = Form("medium"),
     scale: float = Form(1.0),
@@ -196,25 +209,27 @@ async def pdf_page_endpoint(
     """Get a specific page from PDF as base64 image"""
     try:
         page_data = await get_pdf_page(path, page, quality, scale)
-        return JSONResponse(content={"detail": page_data})
+        return {"detail": page_data}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting PDF page {page} for {path}: {tb_str}")
+        logger.exception("Error getting PDF page %s for %s", page, path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/pdf_search")
+@router.post("/pdf_search", response_model=DetailResponse)
 async def pdf_search_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     search_text: str = Form(...),
     current_user: dict = Depends(jwt_required)
 ):
     """Search for text within PDF"""
     try:
         search_results = await search_pdf_text(path, search_text)
-        return JSONResponse(content={"detail": search_results})
+        return {"detail": search_results}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error searching PDF {path}: {tb_str}")
+        logger.exception("Error searching PDF %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/pdf_raw")
@@ -229,56 +244,60 @@ async def pdf_raw_endpoint(
             
         raw_pdf = await get_raw_pdf(path)
         return raw_pdf
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error serving raw PDF {path}: {tb_str}")
+        logger.exception("Error serving raw PDF %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
 # Document-specific endpoints
-@router.post("/docx_info")
+@router.post("/docx_info", response_model=DetailResponse)
 async def docx_info_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     current_user: dict = Depends(jwt_required)
 ):
     """Get Word document metadata"""
     try:
         info = await get_docx_info(path)
-        return JSONResponse(content={"detail": info})
+        return {"detail": info}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting DOCX info for {path}: {tb_str}")
+        logger.exception("Error getting DOCX info for %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/xlsx_info")
+@router.post("/xlsx_info", response_model=DetailResponse)
 async def xlsx_info_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     current_user: dict = Depends(jwt_required)
 ):
     """Get Excel file metadata and sheet names"""
     try:
         info = await get_xlsx_info(path)
-        return JSONResponse(content={"detail": info})
+        return {"detail": info}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting XLSX info for {path}: {tb_str}")
+        logger.exception("Error getting XLSX info for %s", path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/xlsx_sheet")
+@router.post("/xlsx_sheet", response_model=DetailResponse)
 async def xlsx_sheet_endpoint(
-    path: str = Form(...),
+    path: str = Depends(safe_path),
     sheet_name: str = Form(...),
     current_user: dict = Depends(jwt_required)
 ):
     """Get a specific sheet from Excel as HTML table"""
     try:
         sheet_data = await get_xlsx_sheet(path, sheet_name)
-        return JSONResponse(content={"detail": sheet_data})
+        return {"detail": sheet_data}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting XLSX sheet {sheet_name} for {path}: {tb_str}")
+        logger.exception("Error getting XLSX sheet %s for %s", sheet_name, path)
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/newly_added")
+@router.get("/newly_added", response_model=DetailResponse)
 async def newly_added_files_endpoint(
     days: int = 3,
     current_user: dict = Depends(jwt_required)
@@ -289,8 +308,9 @@ async def newly_added_files_endpoint(
             days = 3  # Default to 3 if invalid value
         
         newly_added = await get_newly_added_files(days)
-        return JSONResponse(content={"detail": newly_added})
+        return {"detail": newly_added}
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting newly added files: {tb_str}")
+        logger.exception("Error getting newly added files")
         raise HTTPException(status_code=500, detail=str(e))
@@ -3,34 +3,32 @@ Files Router - Clean, optimized file management endpoints
 Handles upload, download, preview, and file operations with proper authentication
 """
 
-import traceback
-import asyncio
 import aiofiles
 import gzip
 import datetime
 import time
-import hashlib
+import secrets
 import logging
-from functools import lru_cache
 from typing import List, Optional, Dict, Any
 from contextvars import ContextVar
-from collections import defaultdict
-from datetime import datetime, timedelta
+from itertools import combinations
+from datetime import datetime
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, Response, Request
-from fastapi.responses import JSONResponse, StreamingResponse, FileResponse
-from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
 
-from app.core.config import REMOTE_DIR, BACKUP_DIR, PREVIEW_DIR
-from app.core.auth import jwt_required
+from app.core.config import REMOTE_DIR, BACKUP_DIR, PREVIEW_DIR, REDIS_URL
+from app.core.auth import jwt_required, permissions_required
 from app.services.file_service import FileService
 from app.routers.utils.api_files_utils import (
     search_files, download_file, delete_file_and_dir, create_dir, 
     upload_files, dir_contents, file_preview, upload_multiple_folders,
     get_pdf_info, get_pdf_page, get_pdf_pages_range, search_pdf_text,
     get_pdf_page_with_text, get_pdf_text_layer, get_raw_pdf,
-    get_docx_info, get_docx_page, get_xlsx_info, get_xlsx_sheet,
+    get_docx_info, get_docx_page, get_xlsx_info, stream_xlsx_sheet,
     get_pptx_info, get_pptx_slide, get_newly_added_files_since_timestamp,
-    get_newly_added_files
+    get_newly_added_files, cached_file_info, single_flight, PDF_QUALITY_SCALES
 )
 
 # Initialize router with performance settings
@@ -42,24 +40,25 @@ router = APIRouter(
     }
 )
 file_service = FileService()
+logger = logging.getLogger(__name__)
 
-# Cache for user roles to reduce database calls
-@lru_cache(maxsize=100)
-def _extract_user_roles(user_str: str) -> List[str]:
-    """Extract user roles from user data with caching"""
-    import json
-    try:
-        user_data = json.loads(user_str)
-        return user_data.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
-    except:
-        return []
+# Response timestamps have 1-second resolution, so format them at most once per second
+_now_iso_second = None
+_now_iso_value = ""
+
+def _now_iso() -> str:
+    """Current local time as an ISO-8601 string, cached for the current second"""
+    global _now_iso_second, _now_iso_value
+    second = int(time.time())
+    if second != _now_iso_second:
+        _now_iso_value = datetime.fromtimestamp(second).isoformat()
+        _now_iso_second = second
+    return _now_iso_value
 
 # Helper functions for role-based authorization
 def check_admin_role(current_user: dict) -> bool:
-    """Check if user has admin role with caching"""
-    user_str = str(current_user)  # Convert to string for caching
-    user_roles = _extract_user_roles(user_str)
-    return "admin" in user_roles
+    """Check if user has the benyon_fe admin role"""
+    return "admin" in current_user.get("_fe_roles_set", ())
 
 def require_admin_role(current_user: dict) -> None:
     """Raise HTTPException if user doesn't have admin role"""
@@ -70,34 +69,6 @@ def require_admin_role(current_user: dict) -> None:
             headers={"WWW-Authenticate": "Bearer"}
         )
 
-# Async batch processing helper
-async def process_files_in_batches(files: List[UploadFile], batch_size: int = 5):
-    """Process files in batches to prevent memory overload"""
-    results = []
-    for i in range(0, len(files), batch_size):
-        batch = files[i:i + batch_size]
-        batch_results = await asyncio.gather(
-            *[process_single_file(file) for file in batch],
-            return_exceptions=True
-        )
-        results.extend(batch_results)
-    return results
-
-async def process_single_file(file: UploadFile) -> dict:
-    """Process a single file asynchronously"""
-    try:
-        # Basic file validation
-        if file.size > 100 * 1024 * 1024:  # 100MB limit
-            raise HTTPException(status_code=413, detail=f"File {file.filename} is too large")
-        
-        return {
-            "filename": file.filename,
-            "size": file.size,
-            "content_type": file.content_type
-        }
-    except Exception as e:
-        return {"filename": file.filename, "error": str(e)}
-
 # Modern FastAPI endpoints with proper authentication and enhanced security
 @router.post("/upload")
 async def upload_files_endpoint(
@@ -110,7 +81,7 @@ async def upload_files_endpoint(
     """Upload multiple files with validation, batch processing, and security checks"""
     try:
         # Rate limiting check
-        check_rate_limit(request)
+        await check_rate_limit(request)
         
         # Check for admin role for uploads
         require_admin_role(current_user)
@@ -119,21 +90,22 @@ async def upload_files_endpoint(
         if len(files) > 50:  # Limit number of files
             raise HTTPException(status_code=413, detail="Too many files. Maximum 50 files allowed.")
         
-        # Validate each file
-        for file in files:
-            await validate_file_size(file, max_size_mb=100)
-            validate_file_type(file, allowed_categories=['image', 'document', 'text'])
+        # Validate every file and report all failures at once
+        validate_file_types(files, allowed_categories=['image', 'document', 'text'])
         
-        # Process files in batches for better performance
-        file_info = await process_files_in_batches(files)
+        # Metadata is already on each UploadFile; size may be None for chunked uploads
+        file_info = [
+            {"filename": file.filename, "size": file.size, "content_type": file.content_type}
+            for file in files
+        ]
         
-        # Upload files using existing utility
-        uploaded_files = await upload_files(folder, files, path or "")
+        # Upload files using existing utility; sizes are checked as the bytes stream in
+        uploaded_files = await upload_files(folder, files, path or "", max_bytes=MAX_UPLOAD_SIZE_MB * 1024 * 1024)
         
         # Generate request ID for tracking
-        request_id = hashlib.md5(f"{time.time()}{request.client.host}".encode()).hexdigest()[:8]
+        request_id = secrets.token_hex(4)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": uploaded_files,
                 "processed_count": len(files),
@@ -159,7 +131,7 @@ async def search_files_endpoint(
         
         results = await search_files(search_str)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={"detail": results, "search_term": search_str},
             headers={"Cache-Control": "max-age=300"}  # Cache for 5 minutes
         )
@@ -181,7 +153,7 @@ async def download_file_endpoint(
         file_response = await download_file(path, user_id, username)
         
         # Add caching headers for static files
-        if isinstance(file_response, FileResponse):
+        if isinstance(file_response, Response):
             file_response.headers["Cache-Control"] = "public, max-age=3600"  # 1 hour cache
             file_response.headers["X-Content-Type-Options"] = "nosniff"
         
@@ -206,11 +178,11 @@ async def delete_file_endpoint(
         
         result = await delete_file_and_dir(path)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": result,
                 "deleted_path": path,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             },
             headers={"Cache-Control": "no-cache"}
         )
@@ -234,11 +206,11 @@ async def create_directory_endpoint(
         
         relative_path = await create_dir(path)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": f"directory created: {relative_path}",
                 "created_path": relative_path,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             },
             headers={"Cache-Control": "no-cache"}
         )
@@ -250,16 +222,16 @@ async def create_directory_endpoint(
 @router.post("/dir_contents")
 async def directory_contents_endpoint(
     path: str = Form(...),
-    current_user: dict = Depends(jwt_required)
+    current_user: dict = Depends(permissions_required)
 ):
     """Get directory contents with permissions and caching"""
     try:
         permissions = current_user.get("permissions", [])
-        roles = current_user.get("resource_access", {}).get("benyon_fe", {}).get("roles", [])
+        roles = current_user["_fe_roles"]
         
         results = await dir_contents(path, permissions, roles)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": results,
                 "path": path,
@@ -270,8 +242,7 @@ async def directory_contents_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error retrieving dir contents of {path}: {tb_str}")
+        logger.exception("Error retrieving dir contents of %s", path)
         raise HTTPException(status_code=500, detail=f"Directory listing failed: {str(e)}")
 
 @router.post("/file_preview")
@@ -281,15 +252,16 @@ async def file_preview_endpoint(
 ):
     """Generate file preview with caching"""
     try:
-        preview_img = await file_preview(path)
+        preview_img = await single_flight(("file_preview", path), lambda: file_preview(path))
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={"detail": preview_img},
             headers={"Cache-Control": "max-age=1800"}  # Cache for 30 minutes
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error processing file {path}: {tb_str}")
+        logger.exception("Error processing file %s", path)
         raise HTTPException(status_code=500, detail=f"Preview generation failed: {str(e)}")
 
 @router.post("/upload_multiple")
@@ -314,19 +286,18 @@ async def upload_multiple_folders_endpoint(
         
         result = await upload_multiple_folders(files, directory_structure)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": result,
                 "files_count": len(files),
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             },
             headers={"Cache-Control": "no-cache"}
         )
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error in upload_multiple endpoint: {tb_str}")
+        logger.exception("Error in upload_multiple endpoint")
         raise HTTPException(status_code=500, detail=f"Multiple upload failed: {str(e)}")
 
 # PDF-specific endpoints with caching and performance improvements
@@ -337,15 +308,16 @@ async def pdf_info_endpoint(
 ):
     """Get PDF metadata with caching"""
     try:
-        pdf_info = await get_pdf_info(path)
+        pdf_info = await cached_file_info(get_pdf_info, path)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={"detail": pdf_info},
             headers={"Cache-Control": "max-age=3600"}  # Cache for 1 hour
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting PDF info for {path}: {tb_str}")
+        logger.exception("Error getting PDF info for %s", path)
         raise HTTPException(status_code=500, detail=f"PDF info retrieval failed: {str(e)}")
 
 @router.post("/pdf_page")
@@ -365,20 +337,22 @@ async def pdf_page_endpoint(
         if scale < 0.1 or scale > 5.0:
             raise HTTPException(status_code=400, detail="Scale must be between 0.1 and 5.0")
         
-        if quality not in ["low", "medium", "high"]:
+        if quality not in PDF_QUALITY_SCALES:
             raise HTTPException(status_code=400, detail="Quality must be 'low', 'medium', or 'high'")
         
-        page_data = await get_pdf_page(path, page, quality, scale)
+        page_data = await single_flight(
+            ("pdf_page", path, page, quality, scale),
+            lambda: get_pdf_page(path, page, quality, scale)
+        )
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={"detail": page_data},
             headers={"Cache-Control": "max-age=1800"}  # Cache for 30 minutes
         )
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting PDF page {page} for {path}: {tb_str}")
+        logger.exception("Error getting PDF page %s for %s", page, path)
         raise HTTPException(status_code=500, detail=f"PDF page retrieval failed: {str(e)}")
 
 @router.post("/pdf_search")
@@ -394,7 +368,7 @@ async def pdf_search_endpoint(
         
         search_results = await search_pdf_text(path, search_text)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": search_results,
                 "search_term": search_text,
@@ -405,8 +379,7 @@ async def pdf_search_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error searching PDF {path}: {tb_str}")
+        logger.exception("Error searching PDF %s", path)
         raise HTTPException(status_code=500, detail=f"PDF search failed: {str(e)}")
 
 @router.get("/pdf_raw")
@@ -434,8 +407,7 @@ async def pdf_raw_endpoint(
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error serving raw PDF {path}: {tb_str}")
+        logger.exception("Error serving raw PDF %s", path)
         raise HTTPException(status_code=500, detail=f"PDF serving failed: {str(e)}")
 
 # Document-specific endpoints with enhanced error handling
@@ -449,17 +421,16 @@ async def docx_info_endpoint(
         if not path.lower().endswith(('.docx', '.doc')):
             raise HTTPException(status_code=400, detail="File must be a Word document")
         
-        info = await get_docx_info(path)
+        info = await cached_file_info(get_docx_info, path)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={"detail": info},
             headers={"Cache-Control": "max-age=1800"}  # Cache for 30 minutes
         )
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting DOCX info for {path}: {tb_str}")
+        logger.exception("Error getting DOCX info for %s", path)
         raise HTTPException(status_code=500, detail=f"Word document info retrieval failed: {str(e)}")
 
 @router.post("/xlsx_info")
@@ -472,17 +443,16 @@ async def xlsx_info_endpoint(
         if not path.lower().endswith(('.xlsx', '.xls')):
             raise HTTPException(status_code=400, detail="File must be an Excel spreadsheet")
         
-        info = await get_xlsx_info(path)
+        info = await cached_file_info(get_xlsx_info, path)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={"detail": info},
             headers={"Cache-Control": "max-age=1800"}  # Cache for 30 minutes
         )
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting XLSX info for {path}: {tb_str}")
+        logger.exception("Error getting XLSX info for %s", path)
         raise HTTPException(status_code=500, detail=f"Excel file info retrieval failed: {str(e)}")
 
 @router.post("/xlsx_sheet")
@@ -499,20 +469,18 @@ async def xlsx_sheet_endpoint(
         if not sheet_name.strip():
             raise HTTPException(status_code=400, detail="Sheet name cannot be empty")
         
-        sheet_data = await get_xlsx_sheet(path, sheet_name)
+        # Rows are sent as they are read instead of building the whole table first
+        sheet_body = await stream_xlsx_sheet(path, sheet_name)
         
-        return JSONResponse(
-            content={"detail": sheet_data},
-            headers={
-                "Cache-Control": "max-age=900",  # Cache for 15 minutes
-                "Content-Type": "application/json"
-            }
+        return StreamingResponse(
+            sheet_body,
+            media_type="application/json",
+            headers={"Cache-Control": "max-age=900"}  # Cache for 15 minutes
         )
     except HTTPException:
         raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting XLSX sheet {sheet_name} for {path}: {tb_str}")
+        logger.exception("Error getting XLSX sheet %s for %s", sheet_name, path)
         raise HTTPException(status_code=500, detail=f"Excel sheet retrieval failed: {str(e)}")
 
 @router.get("/newly_added")
@@ -530,27 +498,28 @@ async def newly_added_files_endpoint(
         
         newly_added = await get_newly_added_files(days)
         
-        return JSONResponse(
+        return ORJSONResponse(
             content={
                 "detail": newly_added,
                 "days_filter": days,
-                "timestamp": datetime.now().isoformat()
+                "timestamp": _now_iso()
             },
             headers={"Cache-Control": "max-age=300"}  # Cache for 5 minutes
         )
+    except HTTPException:
+        raise
     except Exception as e:
-        tb_str = traceback.format_exc()
-        print(f"Error getting newly added files: {tb_str}")
+        logger.exception("Error getting newly added files")
         raise HTTPException(status_code=500, detail=f"Newly added files retrieval failed: {str(e)}")
 
 # Health check endpoint for monitoring
 @router.get("/health")
 async def health_check():
     """Health check endpoint for monitoring"""
-    return JSONResponse(
+    return ORJSONResponse(
         content={
             "status": "healthy",
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": _now_iso(),
             "service": "files-api"
         },
         headers={"Cache-Control": "no-cache"}
@@ -560,62 +529,69 @@ async def health_check():
 request_id_ctx: ContextVar[str] = ContextVar('request_id', default="")
 
 class RateLimiter:
-    """Simple in-memory rate limiter"""
+    """Simple in-memory fixed-window rate limiter"""
     
     def __init__(self, max_requests: int = 100, window_minutes: int = 1):
         self.max_requests = max_requests
         self.window_minutes = window_minutes
-        self.requests = defaultdict(list)
+        self.window_seconds = window_minutes * 60
+        self.counts: Dict[str, int] = {}
+        self._window = None
     
-    def is_allowed(self, client_ip: str) -> bool:
+    async def is_allowed(self, client_ip: str) -> bool:
         """Check if request is allowed for given IP"""
-        now = datetime.now()
-        window_start = now - timedelta(minutes=self.window_minutes)
-        
-        # Clean old requests
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip] 
-            if req_time > window_start
-        ]
-        
-        # Check if within limit
-        if len(self.requests[client_ip]) >= self.max_requests:
-            return False
-        
-        # Add current request
-        self.requests[client_ip].append(now)
-        return True
-
-# Initialize rate limiter
-rate_limiter = RateLimiter(max_requests=50, window_minutes=1)
-
-def check_rate_limit(request: Request) -> None:
+        window = int(time.monotonic() // self.window_seconds)
+        if window != self._window:
+            # Counts from earlier windows are never consulted again
+            self.counts.clear()
+            self._window = window
+        
+        count = self.counts.get(client_ip, 0) + 1
+        self.counts[client_ip] = count
+        return count <= self.max_requests
+
+class RedisRateLimiter:
+    """Fixed-window rate limiter shared by all workers through Redis INCR + EXPIRE"""
+    
+    def __init__(self, redis_url: str, max_requests: int = 100, window_minutes: int = 1, prefix: str = "rl"):
+        self.redis = aioredis.from_url(redis_url)
+        self.max_requests = max_requests
+        self.window_seconds = window_minutes * 60
+        self.prefix = prefix
+    
+    async def is_allowed(self, client_ip: str) -> bool:
+        """Check if request is allowed for given IP; fails open if Redis is unreachable"""
+        window = int(time.time()) // self.window_seconds
+        key = f"{self.prefix}:{client_ip}:{window}"
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.incr(key)
+                pipe.expire(key, self.window_seconds)
+                count, _ = await pipe.execute()
+        except RedisError:
+            logger.warning("Rate limiter backend unavailable, allowing request")
+            return True
+        
+        return count <= self.max_requests
+
+# Initialize rate limiter; Redis keeps the limit global across workers when configured
+if REDIS_URL:
+    rate_limiter = RedisRateLimiter(REDIS_URL, max_requests=50, window_minutes=1)
+else:
+    rate_limiter = RateLimiter(max_requests=50, window_minutes=1)
+
+async def check_rate_limit(request: Request) -> None:
     """Check rate limit for the request"""
     client_ip = request.client.host
-    if not rate_limiter.is_allowed(client_ip):
+    if not await rate_limiter.is_allowed(client_ip):
         raise HTTPException(
             status_code=429, 
             detail="Too many requests. Please try again later.",
             headers={"Retry-After": "60"}
         )
 
-# File size validation helpers
-async def validate_file_size(file: UploadFile, max_size_mb: int = 100) -> None:
-    """Validate file size asynchronously"""
-    if file.size is None:
-        # Read first chunk to estimate size
-        content = await file.read(1024 * 1024)  # Read 1MB
-        await file.seek(0)  # Reset file pointer
-        if len(content) >= max_size_mb * 1024 * 1024:
-            raise HTTPException(
-                status_code=413, 
-                detail=f"File too large. Maximum size is {max_size_mb}MB"
-            )
-    elif file.size > max_size_mb * 1024 * 1024:
-        raise HTTPException(
-            status_code=413, 
-            detail=f"File too large. Maximum size is {max_size_mb}MB"
-        )
+# File size limit enforced by the streaming upload writer
+MAX_UPLOAD_SIZE_MB = 100
 
 # Content type validation
 ALLOWED_FILE_TYPES = {
@@ -629,17 +605,34 @@ ALLOWED_FILE_TYPES = {
     'text': ['text/plain', 'text/csv', 'application/json', 'application/xml']
 }
 
-def validate_file_type(file: UploadFile, allowed_categories: List[str] = None) -> None:
+# Flat MIME sets for every combination of categories, built once at import
+_ALLOWED_TYPES_BY_CATEGORIES = {
+    frozenset(combo): frozenset().union(*(ALLOWED_FILE_TYPES[category] for category in combo))
+    for r in range(1, len(ALLOWED_FILE_TYPES) + 1)
+    for combo in combinations(ALLOWED_FILE_TYPES, r)
+}
+DEFAULT_FILE_CATEGORIES = ('image', 'document', 'text')
+
+def validate_file_type(file: UploadFile, allowed_categories: List[str] = DEFAULT_FILE_CATEGORIES) -> None:
     """Validate file content type"""
-    if allowed_categories is None:
-        allowed_categories = ['image', 'document', 'text']
-    
-    allowed_types = []
-    for category in allowed_categories:
-        allowed_types.extend(ALLOWED_FILE_TYPES.get(category, []))
+    # Unknown category names are ignored, as they always have been
+    known_categories = frozenset(allowed_categories).intersection(ALLOWED_FILE_TYPES)
+    allowed_types = _ALLOWED_TYPES_BY_CATEGORIES.get(known_categories, frozenset())
     
     if file.content_type not in allowed_types:
         raise HTTPException(
             status_code=415, 
-            detail=f"File type {file.content_type} not allowed. Allowed types: {allowed_types}"
+            detail=f"File type {file.content_type} not allowed. Allowed types: {sorted(allowed_types)}"
         )
+
+def validate_file_types(files: List[UploadFile], allowed_categories: List[str] = DEFAULT_FILE_CATEGORIES) -> None:
+    """Validate the content type of every file, raising a single 415 that lists each rejected file"""
+    errors = []
+    for file in files:
+        try:
+            validate_file_type(file, allowed_categories)
+        except HTTPException as e:
+            errors.append({"filename": file.filename, "error": e.detail})
+    
+    if errors:
+        raise HTTPException(status_code=415, detail=errors)
@@ -7,15 +7,16 @@ from fastapi import APIRouter, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse
 from typing import Dict
 
-from app.core.auth import jwt_required, keycloak_service
+from app.core.auth import jwt_required, permissions_required, keycloak_service
 
 router = APIRouter()
 
 @router.get("/user-info")
-async def get_user_info(current_user: dict = Depends(jwt_required)):
+async def get_user_info(current_user: dict = Depends(permissions_required)):
     """Get current user information from token"""
     return {
-        "user": current_user,
+        # Leave out the private role/permission sets the auth dependencies add to the claims
+        "user": {key: value for key, value in current_user.items() if not key.startswith("_")},
         "authenticated": True
     }
 
@@ -1,21 +1,30 @@
+import asyncio
+import contextlib
 import tempfile
 import subprocess
 import uuid
 import os
+import stat
 from pathlib import Path
 import datetime
 import shutil
 import traceback
 from fastapi import HTTPException
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, Response
+from starlette.background import BackgroundTask
+from starlette.concurrency import iterate_in_threadpool
 from pathlib import Path
 import base64
 from io import BytesIO
 import fitz
 from PIL import Image
 import json
+import orjson
 import hashlib
+import mimetypes
+from urllib.parse import quote
 from functools import lru_cache
+from collections import OrderedDict
 import docx
 import openpyxl
 import pptx
@@ -23,6 +32,8 @@ from fastapi.responses import HTMLResponse
 
 from app.routers.utils.misc_files_utils import *
 from app.routers.utils.misc_keycloak_utils import *
+from app.core.config import USE_X_ACCEL_REDIRECT, X_ACCEL_PREFIX
+from app.core.executors import run_in_process
 
 
 # Cache for PDF documents to avoid reopening frequently
@@ -60,56 +71,144 @@ def get_cached_pdf(abs_path):
         raise HTTPException(status_code=500, detail=f"Error loading PDF: {str(e)}")
 
 
+# Parsed document info shared across users, keyed by (info function, abs path, mtime_ns, size)
+# so any change to the file produces a new key
+INFO_CACHE_MAXSIZE = 2048
+info_cache = OrderedDict()
+_info_locks = {}
+
+async def cached_file_info(info_func, path):
+    """Return info_func(path) from a process-wide LRU; concurrent misses for the same file parse it once"""
+    abs_path = os.path.normpath(os.path.join(REMOTE_BASE_DIR, path.lstrip("/\\")))
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        # Let the info function report the missing file as usual
+        return await info_func(path)
+    
+    key = (info_func.__name__, abs_path, st.st_mtime_ns, st.st_size)
+    lock = _info_locks.setdefault(key, asyncio.Lock())
+    try:
+        async with lock:
+            if key in info_cache:
+                info_cache.move_to_end(key)
+                return info_cache[key]
+            
+            info = await info_func(path)
+            info_cache[key] = info
+            if len(info_cache) > INFO_CACHE_MAXSIZE:
+                info_cache.popitem(last=False)
+            return info
+    finally:
+        if not lock.locked():
+            _info_locks.pop(key, None)
+
+
+# Renders currently in progress, so identical concurrent requests share one result
+_inflight = {}
+
+async def single_flight(key, factory):
+    """
+    Await factory() once per key at a time; callers arriving while it runs share its result.
+    The shared task is shielded so one caller disconnecting does not cancel it for the others.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def _pixmap_image(pix):
+    """Wrap a PyMuPDF pixmap's samples as a PIL image, skipping a PNG encode/decode round trip"""
+    mode = {1: "L", 3: "RGB", 4: "RGBA"}[pix.n]
+    return Image.frombytes(mode, (pix.width, pix.height), pix.samples)
+
+
+def _render_preview(abs_path, ext):
+    """Render a 100px PNG thumbnail as base64 (runs in the process pool)"""
+    if ext == ".pdf":
+        with fitz.open(abs_path) as doc:
+            if doc.page_count < 1:
+                raise ValueError("Could not render PDF")
+            page = doc.load_page(0)
+            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
+            img = _pixmap_image(pix)
+    else:
+        img = Image.open(abs_path)
+
+    img.thumbnail((100, 100))
+    buffered = BytesIO()
+    img.save(buffered, format="PNG")
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
 async def file_preview(path):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     # print(abs_path)
     if not os.path.isfile(abs_path):
         raise HTTPException(status_code=400, detail="Invalid file path")
     ext = os.path.splitext(abs_path)[1].lower()
+    if ext not in [".pdf", ".png", ".jpg", ".jpeg"]:
+        raise HTTPException(status_code=415, detail="Preview not supported for this file type")
+    
     try:
-        if ext == ".pdf":
-            doc = fitz.open(abs_path)
-            if doc.page_count < 1:
-                raise HTTPException(status_code=500, detail="Could not render PDF")
-            page = doc.load_page(0)
-            pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-            img_data = pix.tobytes("png")
-            img = Image.open(BytesIO(img_data))
-        elif ext in [".png", ".jpg", ".jpeg"]:
-            img = Image.open(abs_path)
-        else:
-            raise HTTPException(status_code=415, detail="Preview not supported for this file type")
+        return await run_in_process(_render_preview, abs_path, ext)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    
 
-        img.thumbnail((100, 100))
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        preview_path = os.path.join(os.getcwd(), "preview/preview_output.png")
-        img.save(preview_path, format="PNG") # save preview
-        img_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        return img_b64
-        
-    except Exception as e:
-        raise e from e
+def accel_redirect_response(abs_path, disposition="attachment", media_type=None, headers=None, background=None):
+    """
+    Build an empty response that tells nginx to send abs_path itself via X-Accel-Redirect.
+    abs_path must live under REMOTE_BASE_DIR.
+    """
+    rel_path = Path(abs_path).resolve().relative_to(Path(REMOTE_BASE_DIR).resolve()).as_posix()
+    filename = os.path.basename(abs_path)
+    if media_type is None:
+        media_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
     
+    response_headers = {
+        "X-Accel-Redirect": X_ACCEL_PREFIX + quote(rel_path),
+        "Content-Disposition": f"{disposition}; filename*=utf-8''{quote(filename)}",
+    }
+    if headers:
+        response_headers.update(headers)
+    
+    return Response(status_code=200, media_type=media_type, headers=response_headers, background=background)
+
 
 async def download_file(path: str, user_id: str = None, username: str = None):
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         relative_path = path.lstrip("/\\")
         abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
         download_file_path = Path(abs_path).resolve()
-        if not download_file_path.is_file():
+        try:
+            st = download_file_path.stat()
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
             raise HTTPException(status_code=404, detail=f"File not found: {download_file_path}")
         
-        # Update user's recent_files attribute in Keycloak if user info is provided
+        # Update user's recent_files attribute in Keycloak if user info is provided.
+        # Runs after the response is sent so the Keycloak round-trips don't
+        # delay the start of the download.
+        background = None
         if user_id and username:
-            await update_user_recent_file_attribute(user_id, username, path)
+            background = BackgroundTask(update_user_recent_file_attribute, user_id, username, path)
+        
+        if USE_X_ACCEL_REDIRECT:
+            return accel_redirect_response(download_file_path, background=background)
         
         return FileResponse(
         path=download_file_path,
-        filename=download_file_path.name
+        filename=download_file_path.name,
+        stat_result=st,
+        background=background
         )
     except Exception as e:
         raise e from e
@@ -117,7 +216,7 @@ async def download_file(path: str, user_id: str = None, username: str = None):
 
 async def search_files(search_str: str):
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         results = search_files_and_folders(base_dir, search_str)
         return results
     except Exception as e:
@@ -126,7 +225,7 @@ async def search_files(search_str: str):
 
 async def dir_contents(path: str, permissions: list, roles: list):
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         relative_path = path.lstrip("/\\")
         abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
         p_abs_path = Path(abs_path)
@@ -141,7 +240,7 @@ async def dir_contents(path: str, permissions: list, roles: list):
 
 async def create_dir(path: str):
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         relative_path = str(Path(path.lstrip("/\\")).as_posix())
         abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
         os.makedirs(abs_path, exist_ok=False)
@@ -166,7 +265,7 @@ async def create_dir(path: str):
 
 async def delete_file_and_dir(path: str):
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         relative_path = str(Path(path.lstrip("/\\")).as_posix())
         # print("relative_path:", relative_path)
         abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
@@ -185,20 +284,52 @@ async def delete_file_and_dir(path: str):
         raise e from e
     
 
-async def upload_files(folder: str, files, path: str):
+async def upload_files(folder: str, files, path: str, max_bytes: int = None):
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        # Reject a batch with a known-oversize file before anything is written
+        if max_bytes is not None:
+            too_large = [file.filename for file in files if file.size is not None and file.size > max_bytes]
+            if too_large:
+                raise HTTPException(status_code=413, detail=f"Files too large: {', '.join(too_large)}")
+        
+        base_dir = REMOTE_BASE_DIR
         relative_path = path.lstrip("/\\") if path else ""
         if folder:
             relative_path = os.path.join(relative_path, folder)
             # print("relative_path:", relative_path)
             await create_dir(relative_path)
         abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
+        
+        # Files sharing a name would race on one path; write those one after another, in upload order
+        by_dest = {}
+        for file in files:
+            by_dest.setdefault(os.path.join(abs_path, file.filename), []).append(file)
+        
+        written = []
+        
+        async def save_group(dest_path, group):
+            for file in group:
+                await save_upload_file(file, dest_path, semaphore, max_bytes)
+                written.append(dest_path)
+        
+        # Write distinct files concurrently, capped at UPLOAD_CONCURRENCY open files
+        semaphore = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+        tasks = [asyncio.create_task(save_group(dest_path, group)) for dest_path, group in by_dest.items()]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # One file failed: stop the others and remove what this request already wrote,
+            # so the upload is all-or-nothing (interrupted writes clean up after themselves)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for dest_path in written:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(dest_path)
+            raise
+        
         uploaded_files = []
         for file in files:
-            file_path = os.path.join(abs_path, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
             relative_file_location = str(Path(os.path.join(relative_path, file.filename)).as_posix()) # e.g. docs/test_file.jpg
             # resource_payload = (
             #     {
@@ -217,6 +348,8 @@ async def upload_files(folder: str, files, path: str):
 
         return uploaded_files
     
+    except HTTPException:
+        raise
     except Exception as e:
         tb_str = traceback.format_exc()
         print(f"Error in upload_files: {tb_str}")
@@ -235,7 +368,7 @@ async def upload_multiple_folders(files, directory_structure_json: str):
         Dictionary with upload results
     """
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         
         # Parse the directory structure
         directory_structure = json.loads(directory_structure_json)
@@ -245,6 +378,7 @@ async def upload_multiple_folders(files, directory_structure_json: str):
         
         uploaded_files = []
         created_dirs = []
+        copy_jobs = []
         
         # Recursively process the directory structure
         await process_directory_structure(
@@ -253,9 +387,16 @@ async def upload_multiple_folders(files, directory_structure_json: str):
             "", 
             file_map, 
             uploaded_files, 
-            created_dirs
+            created_dirs,
+            copy_jobs
         )
         
+        # Write the collected files through the bounded worker pipeline
+        errors = await copy_files_pipeline(copy_jobs)
+        if errors:
+            failed = [os.path.relpath(dest_path, base_dir) for dest_path, _ in errors]
+            raise HTTPException(status_code=500, detail=f"Failed to write files: {failed}")
+        
         return {
             "uploaded_files": uploaded_files,
             "created_directories": created_dirs,
@@ -265,6 +406,8 @@ async def upload_multiple_folders(files, directory_structure_json: str):
         
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON in directory_structure: {str(e)}")
+    except HTTPException:
+        raise
     except Exception as e:
         tb_str = traceback.format_exc()
         print(f"Error in upload_multiple_folders: {tb_str}")
@@ -273,7 +416,7 @@ async def upload_multiple_folders(files, directory_structure_json: str):
 
 async def get_pdf_info(path):
     """Get PDF metadata including page count, dimensions, etc."""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
@@ -314,61 +457,65 @@ async def get_pdf_info(path):
         raise HTTPException(status_code=500, detail=f"Error reading PDF info: {str(e)}")
 
 
+# Render zoom factor for each PDF page quality; also the set of valid quality values
+PDF_QUALITY_SCALES = {
+    "low": 1.0,
+    "medium": 1.5,
+    "high": 2.0
+}
+
+def _render_pdf_page(abs_path, page_num, final_scale):
+    """Render one PDF page to a base64 PNG (runs in the process pool)"""
+    with fitz.open(abs_path) as doc:
+        if page_num < 1 or page_num > doc.page_count:
+            raise ValueError(f"Page {page_num} not found. PDF has {doc.page_count} pages")
+        
+        # Load the specific page (0-indexed)
+        page = doc.load_page(page_num - 1)
+        
+        # Render page to image
+        matrix = fitz.Matrix(final_scale, final_scale)
+        pix = page.get_pixmap(matrix=matrix)
+        img = _pixmap_image(pix)
+    
+    # Convert to base64
+    buffered = BytesIO()
+    img.save(buffered, format="PNG", optimize=True)
+    img_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    
+    return {
+        "page_number": page_num,
+        "image_data": img_b64,
+        "width": img.width,
+        "height": img.height,
+        "scale": final_scale
+    }
+
+
 async def get_pdf_page(path, page_num, quality="medium", scale=1.0):
     """Get a specific page from PDF as base64 image"""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
     if not os.path.isfile(abs_path):
         raise HTTPException(status_code=400, detail="Invalid file path")
     
+    # Set quality based on parameter
+    base_scale = PDF_QUALITY_SCALES.get(quality, 1.5)
+    final_scale = base_scale * scale
+    
     try:
-        doc = get_cached_pdf(abs_path)
-        
-        if page_num < 1 or page_num > doc.page_count:
-            raise HTTPException(status_code=400, detail=f"Page {page_num} not found. PDF has {doc.page_count} pages")
-        
-        # Load the specific page (0-indexed)
-        page = doc.load_page(page_num - 1)
-        
-        # Set quality based on parameter
-        quality_settings = {
-            "low": 1.0,
-            "medium": 1.5,
-            "high": 2.0
-        }
-        base_scale = quality_settings.get(quality, 1.5)
-        final_scale = base_scale * scale
-        
-        # Render page to image
-        matrix = fitz.Matrix(final_scale, final_scale)
-        pix = page.get_pixmap(matrix=matrix)
-        img_data = pix.tobytes("png")
-        
-        # Convert to PIL Image for additional processing if needed
-        img = Image.open(BytesIO(img_data))
-        
-        # Convert to base64
-        buffered = BytesIO()
-        img.save(buffered, format="PNG", optimize=True)
-        img_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        
-        return {
-            "page_number": page_num,
-            "image_data": img_b64,
-            "width": img.width,
-            "height": img.height,
-            "scale": final_scale
-        }
-        
+        return await run_in_process(_render_pdf_page, abs_path, page_num, final_scale)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error rendering PDF page: {str(e)}")
 
 
 async def get_pdf_pages_range(path, start_page, end_page, quality="medium", scale=1.0):
     """Get multiple PDF pages in a range"""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
@@ -408,7 +555,7 @@ async def get_pdf_pages_range(path, start_page, end_page, quality="medium", scal
 
 async def search_pdf_text(path, search_text):
     """Search for text within PDF and return page numbers and positions"""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
@@ -474,7 +621,7 @@ async def search_pdf_text(path, search_text):
 
 async def get_pdf_page_with_text(path, page_num, quality="medium", scale=1.0):
     """Get a PDF page with both image and text layer data"""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
@@ -490,15 +637,13 @@ async def get_pdf_page_with_text(path, page_num, quality="medium", scale=1.0):
         page = doc.load_page(page_num - 1)
         
         # Get the image data (same as before)
-        quality_settings = {"low": 1.0, "medium": 1.5, "high": 2.0}
-        base_scale = quality_settings.get(quality, 1.5)
+        base_scale = PDF_QUALITY_SCALES.get(quality, 1.5)
         final_scale = base_scale * scale
         
         matrix = fitz.Matrix(final_scale, final_scale)
         pix = page.get_pixmap(matrix=matrix)
-        img_data = pix.tobytes("png")
+        img = _pixmap_image(pix)
         
-        img = Image.open(BytesIO(img_data))
         buffered = BytesIO()
         img.save(buffered, format="PNG", optimize=True)
         img_b64 = base64.b64encode(buffered.getvalue()).decode("utf-8")
@@ -521,7 +666,7 @@ async def get_pdf_page_with_text(path, page_num, quality="medium", scale=1.0):
 
 async def get_pdf_text_layer(path, page_num, scale=1.0):
     """Get text layer data for a PDF page with positioning"""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
@@ -613,7 +758,7 @@ async def get_pdf_text_layer(path, page_num, scale=1.0):
 
 async def get_raw_pdf(path):
     """Serve raw PDF file for PDF.js viewer"""
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     
@@ -625,6 +770,14 @@ async def get_raw_pdf(path):
         raise HTTPException(status_code=415, detail="File is not a PDF")
     
     try:
+        if USE_X_ACCEL_REDIRECT:
+            return accel_redirect_response(
+                abs_path,
+                disposition="inline",
+                media_type="application/pdf",
+                headers={"Cache-Control": "public, max-age=3600"}
+            )
+        
         return FileResponse(
             path=abs_path,
             media_type="application/pdf",
@@ -639,7 +792,7 @@ async def get_raw_pdf(path):
 
 
 async def get_docx_info(path):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     if not os.path.isfile(abs_path):
@@ -660,7 +813,7 @@ async def get_docx_info(path):
         raise HTTPException(status_code=500, detail=f"Error reading DOCX: {str(e)}")
 
 async def get_docx_page(path, page_num):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     if not os.path.isfile(abs_path):
@@ -701,7 +854,7 @@ async def get_docx_page(path, page_num):
                 pass
 
 async def get_xlsx_info(path):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     if not os.path.isfile(abs_path):
@@ -717,27 +870,83 @@ async def get_xlsx_info(path):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading XLSX: {str(e)}")
 
-async def get_xlsx_sheet(path, sheet_name):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
-    relative_path = path.lstrip("/\\")
-    abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
-    if not os.path.isfile(abs_path):
-        raise HTTPException(status_code=400, detail="Invalid file path")
+def _render_xlsx_sheet(abs_path, sheet_name):
+    """Render a worksheet as an HTML table (runs in the process pool)"""
+    wb = openpyxl.load_workbook(abs_path, read_only=True)
     try:
-        wb = openpyxl.load_workbook(abs_path, read_only=True)
         if sheet_name not in wb.sheetnames:
-            raise HTTPException(status_code=404, detail="Sheet not found")
+            raise KeyError(sheet_name)
         ws = wb[sheet_name]
         html = "<table border='1'>"
         for row in ws.iter_rows(values_only=True):
             html += "<tr>" + "".join(f"<td>{cell if cell is not None else ''}</td>" for cell in row) + "</tr>"
         html += "</table>"
         return {"sheet": sheet_name, "html": html}
+    finally:
+        wb.close()
+
+
+async def get_xlsx_sheet(path, sheet_name):
+    base_dir = REMOTE_BASE_DIR
+    relative_path = path.lstrip("/\\")
+    abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
+    if not os.path.isfile(abs_path):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    try:
+        return await run_in_process(_render_xlsx_sheet, abs_path, sheet_name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Sheet not found")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading XLSX sheet: {str(e)}")
 
+XLSX_STREAM_ROWS = 256  # table rows per streamed chunk
+
+def _json_fragment(text):
+    """Encode text as the inside of a JSON string, so fragments can be concatenated"""
+    return orjson.dumps(text)[1:-1]
+
+
+def _xlsx_sheet_json_chunks(wb, sheet_name):
+    """Yield the {"detail": {"sheet", "html"}} JSON body for a sheet a few rows at a time, closing wb at the end"""
+    try:
+        ws = wb[sheet_name]
+        yield b'{"detail":{"sheet":' + orjson.dumps(sheet_name) + b',"html":"' + _json_fragment("<table border='1'>")
+        rows = []
+        for row in ws.iter_rows(values_only=True):
+            rows.append("<tr>" + "".join(f"<td>{cell if cell is not None else ''}</td>" for cell in row) + "</tr>")
+            if len(rows) >= XLSX_STREAM_ROWS:
+                yield _json_fragment("".join(rows))
+                rows.clear()
+        rows.append("</table>")
+        yield _json_fragment("".join(rows)) + b'"}}'
+    finally:
+        wb.close()
+
+
+async def stream_xlsx_sheet(path, sheet_name):
+    """
+    Validate the workbook and sheet up front, then return an async iterator over the
+    same JSON body the xlsx_sheet endpoint used to build in memory.
+    """
+    base_dir = REMOTE_BASE_DIR
+    relative_path = path.lstrip("/\\")
+    abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
+    if not os.path.isfile(abs_path):
+        raise HTTPException(status_code=400, detail="Invalid file path")
+    try:
+        wb = await asyncio.to_thread(openpyxl.load_workbook, abs_path, read_only=True)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading XLSX sheet: {str(e)}")
+    if sheet_name not in wb.sheetnames:
+        wb.close()
+        raise HTTPException(status_code=404, detail="Sheet not found")
+    
+    # openpyxl parses rows lazily, so each chunk is produced in the threadpool
+    return iterate_in_threadpool(_xlsx_sheet_json_chunks(wb, sheet_name))
+
+
 async def get_pptx_info(path):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     if not os.path.isfile(abs_path):
@@ -754,7 +963,7 @@ async def get_pptx_info(path):
         raise HTTPException(status_code=500, detail=f"Error reading PPTX: {str(e)}")
 
 async def get_pptx_slide(path, slide_num):
-    base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+    base_dir = REMOTE_BASE_DIR
     relative_path = path.lstrip("/\\")
     abs_path = os.path.normpath(os.path.join(base_dir, relative_path))
     if not os.path.isfile(abs_path):
@@ -786,7 +995,7 @@ async def get_newly_added_files(cutoff_criteria=3):
         List of recently modified files with their details
     """
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         
         if not os.path.exists(base_dir):
             raise HTTPException(status_code=404, detail="Remote directory does not exist")
@@ -809,7 +1018,7 @@ async def get_newly_added_files_since_timestamp(timestamp_dt):
         List of recently modified files with their details
     """
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         
         if not os.path.exists(base_dir):
             raise HTTPException(status_code=404, detail="Remote directory does not exist")
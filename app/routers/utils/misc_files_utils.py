@@ -1,11 +1,26 @@
+import asyncio
+import contextlib
 import ctypes
 from ctypes import wintypes
 import os
+import aiofiles
+from fastapi import HTTPException
 from pathlib import Path
 import datetime
-import shutil
 import traceback
 
+from app.core.config import UPLOAD_CHUNK_SIZE
+
+
+# Root of the served file tree, resolved once at import
+REMOTE_BASE_DIR = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+PREVIEW_BASE_DIR = os.path.normpath(os.path.join(os.getcwd(), "preview"))
+
+# Upload streaming settings
+UPLOAD_CONCURRENCY = 8  # max files written at once per request
+PIPELINE_WORKERS = 4  # disk writers for folder uploads
+PIPELINE_QUEUE_SIZE = 16  # pending files handed to the writers
+
 
 def _get_owner_windows(path: str) -> str:
     """
@@ -123,6 +138,114 @@ def get_owner(path: str) -> str:
         return "UNKNOWN"
 
 
+async def iter_upload_chunks(file, max_bytes: int = None):
+    """
+    Yield an UploadFile's content in UPLOAD_CHUNK_SIZE chunks, counting bytes as they arrive.
+    Raises HTTP 413 as soon as more than max_bytes have been read, so oversized
+    uploads are rejected without buffering them.
+    """
+    if max_bytes is not None and file.size is not None and file.size > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File {file.filename} is too large")
+    
+    received = 0
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        received += len(chunk)
+        if max_bytes is not None and received > max_bytes:
+            raise HTTPException(status_code=413, detail=f"File {file.filename} is too large")
+        yield chunk
+
+
+def _preallocate(fd: int, size: int):
+    """Reserve size bytes for fd in one call, where the OS and filesystem support it"""
+    if size and hasattr(os, "posix_fallocate"):
+        with contextlib.suppress(OSError):
+            os.posix_fallocate(fd, 0, size)
+
+
+async def save_upload_file(file, dest_path: str, semaphore: asyncio.Semaphore = None, max_bytes: int = None):
+    """
+    Stream an UploadFile to dest_path, validating its size in the same pass.
+    An optional semaphore bounds how many files are written concurrently.
+    A partially written file is removed if the size limit is exceeded or the write fails or is cancelled.
+    When the client sent the file size, the file's extents are reserved up front.
+    """
+    size_hint = file.size if max_bytes is None or (file.size or 0) <= max_bytes else None
+    async with semaphore or contextlib.nullcontext():
+        try:
+            async with aiofiles.open(dest_path, "wb", buffering=UPLOAD_CHUNK_SIZE) as buffer:
+                _preallocate(buffer.fileno(), size_hint)
+                async for chunk in iter_upload_chunks(file, max_bytes):
+                    await buffer.write(chunk)
+                if size_hint:
+                    # Preallocation set the file length to the hint; cut it back if the body was shorter
+                    await buffer.truncate()
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(dest_path)
+            raise
+
+
+def _copy_with_buffer(src, dest_path: str, buffer: bytearray):
+    """Copy a file object to dest_path through a caller-owned buffer (runs in a worker thread)"""
+    view = memoryview(buffer)
+    size = src.seek(0, os.SEEK_END)
+    src.seek(0)
+    with open(dest_path, "wb") as out:
+        _preallocate(out.fileno(), size)
+        while n := src.readinto(buffer):
+            out.write(view[:n])
+
+
+async def copy_files_pipeline(jobs, workers: int = PIPELINE_WORKERS):
+    """
+    Write (UploadFile, dest_path) jobs to disk through a bounded queue drained by a fixed pool of workers.
+    Each worker reuses one UPLOAD_CHUNK_SIZE buffer for every file it copies.
+    Jobs sharing an UploadFile are copied one after another by the same worker, since they read
+    through one file position. If any copy fails, every destination written is removed.
+    Returns a list of (dest_path, error) for the files that failed.
+    """
+    # id(UploadFile) -> (UploadFile, [dest_path, ...])
+    groups = {}
+    for file_obj, dest_path in jobs:
+        groups.setdefault(id(file_obj), (file_obj, []))[1].append(dest_path)
+    
+    queue = asyncio.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    errors = []
+    touched = []
+    
+    async def worker():
+        buffer = bytearray(UPLOAD_CHUNK_SIZE)
+        while True:
+            file_obj, dest_paths = await queue.get()
+            try:
+                for dest_path in dest_paths:
+                    touched.append(dest_path)
+                    try:
+                        await asyncio.to_thread(_copy_with_buffer, file_obj.file, dest_path, buffer)
+                    except Exception as e:
+                        errors.append((dest_path, e))
+            finally:
+                queue.task_done()
+    
+    tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        for group in groups.values():
+            await queue.put(group)
+        await queue.join()
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    
+    if errors:
+        # Keep the upload all-or-nothing: drop the files that succeeded and any partial writes
+        for dest_path in touched:
+            with contextlib.suppress(OSError):
+                os.remove(dest_path)
+    
+    return errors
+
+
 def search_files_and_folders(root, query, case_sensitive=False):
     """
     Recursively search under `root` for any file or folder whose name contains `query`.
@@ -141,8 +264,7 @@ def search_files_and_folders(root, query, case_sensitive=False):
             name_to_check = dirname if case_sensitive else dirname.lower()
             if (query in dirname) if case_sensitive else (query_lower in name_to_check):
                 found_path = os.path.join(dirpath, dirname)
-                base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
-                relative_path = os.path.relpath(found_path, base_dir)
+                relative_path = os.path.relpath(found_path, REMOTE_BASE_DIR)
                 # Convert backslashes to forward slashes for cross-platform compatibility
                 relative_path = relative_path.replace(os.sep, '/')
                 matches.append(relative_path)
@@ -152,8 +274,7 @@ def search_files_and_folders(root, query, case_sensitive=False):
             name_to_check = filename if case_sensitive else filename.lower()
             if (query in filename) if case_sensitive else (query_lower in name_to_check):
                 found_path = os.path.join(dirpath, filename)
-                base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
-                relative_path = os.path.relpath(found_path, base_dir)
+                relative_path = os.path.relpath(found_path, REMOTE_BASE_DIR)
                 # Convert backslashes to forward slashes for cross-platform compatibility
                 relative_path = relative_path.replace(os.sep, '/')
                 matches.append(relative_path)
@@ -208,7 +329,7 @@ def has_hierarchical_permission(target_path, permissions, roles):
 async def dir_contents_details(abs_path: str, permissions: list, roles: list):
     try:
         # permissions
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         relative_path = str(Path(os.path.relpath(abs_path, base_dir)).as_posix())
         # print('relative_path:', relative_path)
         # print('permissions:', permissions)
@@ -306,9 +427,10 @@ async def dir_contents_details(abs_path: str, permissions: list, roles: list):
         raise e from e
 
 
-async def process_directory_structure(structure, base_dir, current_path, file_map, uploaded_files, created_dirs):
+async def process_directory_structure(structure, base_dir, current_path, file_map, uploaded_files, created_dirs, copy_jobs):
     """
-    Recursively process directory structure and create directories/files.
+    Recursively process directory structure, creating directories and queueing
+    a (file, destination) entry in copy_jobs for every file to write.
     
     Expected structure format:
     {
@@ -338,9 +460,8 @@ async def process_directory_structure(structure, base_dir, current_path, file_ma
                     # Ensure directory exists
                     os.makedirs(os.path.dirname(abs_file_path), exist_ok=True)
                     
-                    # Save the file
-                    with open(abs_file_path, "wb") as buffer:
-                        shutil.copyfileobj(file_obj.file, buffer)
+                    # Queue the file; copy_files_pipeline writes it
+                    copy_jobs.append((file_obj, abs_file_path))
                     
                     # Create resource in Keycloak
                     relative_file_location = str(Path(relative_file_path).as_posix())
@@ -391,7 +512,8 @@ async def process_directory_structure(structure, base_dir, current_path, file_ma
                     new_path, 
                     file_map, 
                     uploaded_files, 
-                    created_dirs
+                    created_dirs,
+                    copy_jobs
                 )
                 
     except Exception as e:
@@ -499,7 +621,7 @@ def scan_recently_modified_files(root_dir, cutoff_criteria=3):
         cutoff_time = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(days=days)
     
     try:
-        base_dir = os.path.normpath(os.path.join(os.getcwd(), "remote"))
+        base_dir = REMOTE_BASE_DIR
         
         for dirpath, dirnames, filenames in os.walk(root_dir):
             for filename in filenames:
@@ -3,70 +3,151 @@ File Service - Business logic for file operations
 Handles file upload, processing, preview generation, and management
 """
 
+import asyncio
+import logging
 import os
 import shutil
+from collections import OrderedDict
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional
 import mimetypes
+import aiofiles
 import fitz  # PyMuPDF
+import numpy as np
 from PIL import Image
 from fastapi import HTTPException, UploadFile
 from fastapi.responses import FileResponse, JSONResponse
 
-from app.core.config import REMOTE_DIR, BACKUP_DIR, PREVIEW_DIR
+from app.core.config import REMOTE_DIR, BACKUP_DIR, PREVIEW_DIR, PNG_COMPRESS_LEVEL, UPLOAD_CHUNK_SIZE
+from app.core.executors import run_in_process
+
+PREVIEW_CACHE_MAX_FILES = 1000  # rendered PDF pages kept in PREVIEW_DIR
+PAGE_COUNT_CACHE_MAXSIZE = 1024  # PDFs whose page count is remembered
+
+# Deleted files are renamed to a tombstone in REMOTE_DIR, then moved to BACKUP_DIR in the background
+TOMBSTONE_PREFIX = ".deleted-"
+BACKUP_MOVE_RETRIES = 5
+BACKUP_RETRY_BASE_DELAY = 0.5  # seconds, doubled after each failed attempt
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = (800, 600)
+JPEG_EXTENSIONS = ('.jpg', '.jpeg')
+
+# libjpeg-turbo is optional; without it JPEG thumbnails go through Pillow like other formats
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    _turbo_jpeg = TurboJPEG()
+except (ImportError, RuntimeError, OSError):
+    _turbo_jpeg = None
+
+
+def _turbo_jpeg_thumbnail(file_path: str, preview_path: str) -> None:
+    """JPEG thumbnail via libjpeg-turbo, downscaling by up to 1/8 during the IDCT itself"""
+    with open(file_path, "rb") as f:
+        jpeg_data = f.read()
+    
+    width, height, _, _ = _turbo_jpeg.decode_header(jpeg_data)
+    target = min(THUMBNAIL_SIZE[0] / width, THUMBNAIL_SIZE[1] / height, 1.0)
+    # Smallest DCT scaling factor that still leaves at least the target size
+    scaling_factor = next(
+        (factor for factor in ((1, 8), (1, 4), (1, 2)) if factor[0] / factor[1] >= target),
+        (1, 1)
+    )
+    
+    pixels = _turbo_jpeg.decode(jpeg_data, pixel_format=TJPF_RGB, scaling_factor=scaling_factor)
+    img = Image.fromarray(pixels)
+    img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+    
+    with open(preview_path, "wb") as f:
+        f.write(_turbo_jpeg.encode(np.asarray(img), quality=85, pixel_format=TJPF_RGB))
+
+
+def _thumbnail_worker(file_path: str, preview_path: str) -> None:
+    """Write an 800x600-bounded JPEG thumbnail of file_path (runs in the process pool)"""
+    if _turbo_jpeg is not None and file_path.lower().endswith(JPEG_EXTENSIONS):
+        _turbo_jpeg_thumbnail(file_path, preview_path)
+        return
+    
+    with Image.open(file_path) as img:
+        img.thumbnail(THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        img.save(preview_path, "JPEG", quality=85)
+
+
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB')
+
+
+def _ext(name: str) -> str:
+    """Lowercased extension of a file name, matching Path(name).suffix without building a Path"""
+    i = name.rfind('.')
+    return name[i:].lower() if 0 < i < len(name) - 1 else ''
 
 
 class FileService:
     """Service class for file operations"""
     
+    _ALLOWED_EXTS = frozenset({
+        '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
+        '.txt', '.csv', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'
+    })
+    
     def __init__(self):
-        self.allowed_extensions = {
-            '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx',
-            '.txt', '.csv', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff'
-        }
+        self._remote = REMOTE_DIR
+        self._backup = BACKUP_DIR
+        self._preview = PREVIEW_DIR
         self.max_file_size = 100 * 1024 * 1024  # 100MB
+        # (directory mtime_ns, list_files result); dropped on upload/delete
+        self._list_cache = None
+        # LRU of PDF path -> (mtime_ns, page count), so cached previews don't reopen the PDF
+        self._page_counts = OrderedDict()
+        # Pending tombstone -> backup moves; referenced here so they aren't garbage collected
+        self._backup_tasks = set()
     
     async def upload_files(self, files: List[UploadFile], current_user: dict) -> Dict:
-        """Upload multiple files with validation"""
+        """Upload multiple files with validation, writing them concurrently"""
         try:
-            uploaded_files = []
-            
+            # Validate the whole batch before anything is written
             for file in files:
-                # Validate file
                 if not self._is_allowed_file(file.filename):
                     raise HTTPException(
                         status_code=400, 
                         detail=f"File type not allowed: {file.filename}"
                     )
-                
-                # Check file size
-                file_content = await file.read()
-                if len(file_content) > self.max_file_size:
+                if file.size is not None and file.size > self.max_file_size:
                     raise HTTPException(
                         status_code=413,
                         detail=f"File too large: {file.filename}"
                     )
-                
-                # Create safe filename
-                safe_filename = self._create_safe_filename(file.filename)
-                file_path = os.path.join(REMOTE_DIR, safe_filename)
-                
-                # Save file
-                with open(file_path, "wb") as buffer:
-                    buffer.write(file_content)
-                
-                uploaded_files.append({
-                    "filename": safe_filename,
-                    "original_name": file.filename,
-                    "size": len(file_content),
-                    "mimetype": file.content_type,
-                    "uploaded_at": datetime.now().isoformat(),
-                    "uploaded_by": current_user.get("preferred_username", "unknown")
-                })
-                
-                # Reset file pointer for potential reuse
-                await file.seek(0)
+            
+            # Reserve every destination up front so files sharing a name get distinct paths, as they
+            # did when each upload saw the previous one on disk
+            reserved = set()
+            safe_filenames = [self._create_safe_filename(file.filename, reserved) for file in files]
+            
+            written = []
+            
+            async def process(file: UploadFile, safe_filename: str) -> Dict:
+                file_meta = await self._process_one(file, safe_filename, current_user)
+                written.append(self._remote / safe_filename)
+                return file_meta
+            
+            tasks = [
+                asyncio.create_task(process(file, safe_filename))
+                for file, safe_filename in zip(files, safe_filenames)
+            ]
+            try:
+                uploaded_files = await asyncio.gather(*tasks)
+            except BaseException:
+                # One file failed: stop the others and remove what this batch already wrote
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                for file_path in written:
+                    file_path.unlink(missing_ok=True)
+                raise
+            finally:
+                self._list_cache = None
             
             return {
                 "message": f"Successfully uploaded {len(uploaded_files)} files",
@@ -74,51 +155,67 @@ class FileService:
                 "total_size": sum(f["size"] for f in uploaded_files)
             }
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
     
+    async def _process_one(self, file: UploadFile, safe_filename: str, current_user: dict) -> Dict:
+        """Store one validated upload, returning its metadata"""
+        file_path = self._remote / safe_filename
+        
+        # Stream file to disk, enforcing the size limit as chunks arrive
+        size = await self._save_upload(file, file_path)
+        
+        return {
+            "filename": safe_filename,
+            "original_name": file.filename,
+            "size": size,
+            "mimetype": file.content_type,
+            "uploaded_at": datetime.now(),
+            "uploaded_by": current_user.get("preferred_username", "unknown")
+        }
+    
     async def list_files(self) -> Dict:
         """List all files with metadata"""
         try:
+            # The directory mtime changes whenever an entry is added, removed or renamed
+            dir_mtime = self._remote.stat().st_mtime_ns
+            if self._list_cache is not None and self._list_cache[0] == dir_mtime:
+                return self._list_cache[1]
+            
             files = []
             total_size = 0
             
-            for filename in os.listdir(REMOTE_DIR):
-                file_path = os.path.join(REMOTE_DIR, filename)
-                if os.path.isfile(file_path):
-                    stat = os.stat(file_path)
-                    files.append({
-                        "filename": filename,
-                        "size": stat.st_size,
-                        "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                        "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
-                        "mimetype": mimetypes.guess_type(filename)[0],
-                        "extension": Path(filename).suffix.lower()
-                    })
-                    total_size += stat.st_size
+            with os.scandir(self._remote) as entries:
+                for entry in entries:
+                    if entry.name.startswith(TOMBSTONE_PREFIX) or not entry.is_file():
+                        continue
+                    file_meta = self._file_metadata(entry)
+                    files.append(file_meta)
+                    total_size += file_meta["size"]
             
             # Sort by modification date (newest first)
             files.sort(key=lambda x: x["modified"], reverse=True)
             
-            return {
+            result = {
                 "files": files,
                 "total": len(files),
                 "total_size": total_size
             }
+            self._list_cache = (dir_mtime, result)
+            
+            return result
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to list files: {str(e)}")
     
     async def search_files(self, query: str) -> Dict:
         """Search files by name"""
         try:
-            all_files = await self.list_files()
-            query_lower = query.lower()
-            
-            matching_files = [
-                file for file in all_files["files"]
-                if query_lower in file["filename"].lower()
-            ]
+            matching_files = self._scan_matching(query.lower())
             
             return {
                 "files": matching_files,
@@ -126,30 +223,36 @@ class FileService:
                 "query": query
             }
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
     
     async def download_file(self, filename: str) -> FileResponse:
         """Download a specific file"""
-        file_path = os.path.join(REMOTE_DIR, filename)
+        file_path = self._file_path(filename)
         
-        if not os.path.exists(file_path):
+        # One stat serves both the existence check and FileResponse's headers
+        try:
+            st = os.stat(file_path)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="File not found")
         
         return FileResponse(
             path=file_path,
             filename=filename,
-            media_type='application/octet-stream'
+            media_type='application/octet-stream',
+            stat_result=st
         )
     
     async def preview_file(self, filename: str, page: int = 1) -> Dict:
         """Generate file preview"""
-        file_path = os.path.join(REMOTE_DIR, filename)
+        file_path = self._file_path(filename)
         
-        if not os.path.exists(file_path):
+        if not file_path.exists():
             raise HTTPException(status_code=404, detail="File not found")
         
-        file_ext = Path(filename).suffix.lower()
+        file_ext = _ext(filename)
         
         try:
             if file_ext == '.pdf':
@@ -159,143 +262,303 @@ class FileService:
             else:
                 return {"message": "Preview not available for this file type"}
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Preview generation failed: {str(e)}")
     
     async def delete_file(self, filename: str) -> Dict:
         """Delete a specific file"""
-        file_path = os.path.join(REMOTE_DIR, filename)
+        file_path = self._file_path(filename)
         
-        if not os.path.exists(file_path):
+        if not file_path.exists():
             raise HTTPException(status_code=404, detail="File not found")
         
         try:
-            # Move to backup before deletion
-            backup_path = os.path.join(BACKUP_DIR, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{filename}")
-            shutil.move(file_path, backup_path)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            backup_path = self._backup / f"{timestamp}_{filename}"
+            
+            # Same-filesystem rename takes the file out of service immediately; the move to
+            # BACKUP_DIR (a full copy if it is on another mount) happens off the request path
+            tombstone = self._remote / f"{TOMBSTONE_PREFIX}{timestamp}_{filename}"
+            os.rename(file_path, tombstone)
+            self._list_cache = None
             
+            self._schedule_backup(tombstone, backup_path)
+            
+            # The move runs in the background: backed_up_to is where the backup will land
             return {
                 "message": f"File {filename} deleted successfully",
-                "backed_up_to": backup_path
+                "backed_up_to": str(backup_path),
+                "backup_status": "pending"
             }
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to delete file: {str(e)}")
     
+    def recover_pending_backups(self) -> int:
+        """
+        Schedule backup moves for tombstones an earlier run left behind (retries exhausted,
+        or cancelled at shutdown). Call once at startup; returns how many were found.
+        """
+        with os.scandir(self._remote) as entries:
+            tombstones = [entry.name for entry in entries if entry.name.startswith(TOMBSTONE_PREFIX)]
+        
+        for name in tombstones:
+            self._schedule_backup(self._remote / name, self._backup / name[len(TOMBSTONE_PREFIX):])
+        return len(tombstones)
+    
+    def _schedule_backup(self, tombstone: Path, backup_path: Path) -> None:
+        """Start moving a tombstone to BACKUP_DIR in the background"""
+        task = asyncio.create_task(self._move_to_backup(tombstone, backup_path))
+        self._backup_tasks.add(task)
+        task.add_done_callback(self._backup_tasks.discard)
+    
+    async def _move_to_backup(self, tombstone: Path, backup_path: Path) -> None:
+        """Move a tombstoned file to BACKUP_DIR, retrying with exponential backoff"""
+        loop = asyncio.get_running_loop()
+        delay = BACKUP_RETRY_BASE_DELAY
+        
+        for attempt in range(1, BACKUP_MOVE_RETRIES + 1):
+            try:
+                await loop.run_in_executor(None, shutil.move, tombstone, backup_path)
+                return
+            except FileNotFoundError:
+                # Already moved, e.g. by another server worker's startup recovery
+                return
+            except OSError:
+                if attempt == BACKUP_MOVE_RETRIES:
+                    logger.exception("Giving up moving %s to %s until the next startup", tombstone, backup_path)
+                    return
+                logger.warning("Backup move of %s failed (attempt %d), retrying in %.1fs",
+                               tombstone, attempt, delay)
+                await asyncio.sleep(delay)
+                delay *= 2
+    
     async def get_file_info(self, filename: str) -> Dict:
         """Get detailed file information"""
-        file_path = os.path.join(REMOTE_DIR, filename)
+        file_path = self._file_path(filename)
         
-        if not os.path.exists(file_path):
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
             raise HTTPException(status_code=404, detail="File not found")
         
         try:
-            stat = os.stat(file_path)
-            file_ext = Path(filename).suffix.lower()
+            file_ext = _ext(filename)
             
             info = {
                 "filename": filename,
                 "size": stat.st_size,
                 "size_human": self._human_readable_size(stat.st_size),
-                "modified": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                "created": datetime.fromtimestamp(stat.st_ctime).isoformat(),
+                "modified": datetime.fromtimestamp(stat.st_mtime),
+                "created": datetime.fromtimestamp(stat.st_ctime),
                 "mimetype": mimetypes.guess_type(filename)[0],
                 "extension": file_ext,
-                "path": file_path
+                "path": str(file_path)
             }
             
             # Add specific info for PDFs
             if file_ext == '.pdf':
-                info.update(await self._get_pdf_info(file_path))
+                info.update(await self._get_pdf_info(file_path, stat.st_mtime_ns))
             
             return info
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to get file info: {str(e)}")
     
+    async def _save_upload(self, file: UploadFile, file_path: Path) -> int:
+        """
+        Stream an upload to file_path in UPLOAD_CHUNK_SIZE chunks and return its size; 413 past max_file_size.
+        The partial file is removed if the write fails or is cancelled.
+        """
+        size = 0
+        try:
+            async with aiofiles.open(file_path, "wb") as buffer:
+                while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > self.max_file_size:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"File too large: {file.filename}"
+                        )
+                    await buffer.write(chunk)
+        except BaseException:
+            file_path.unlink(missing_ok=True)
+            raise
+        
+        return size
+    
+    def _file_path(self, filename: str) -> Path:
+        """Path of a served file; tombstones of deleted files are never served"""
+        if filename.startswith(TOMBSTONE_PREFIX):
+            raise HTTPException(status_code=404, detail="File not found")
+        return self._remote / filename
+    
+    def _file_metadata(self, entry: os.DirEntry) -> Dict:
+        """Build the listing metadata for a directory entry"""
+        stat = entry.stat()
+        return {
+            "filename": entry.name,
+            "size": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime),
+            "created": datetime.fromtimestamp(stat.st_ctime),
+            "mimetype": mimetypes.guess_type(entry.name)[0],
+            "extension": _ext(entry.name)
+        }
+    
+    def _scan_matching(self, query_lower: str) -> List[Dict]:
+        """Scan REMOTE_DIR once, building metadata only for files whose name contains query_lower"""
+        matches = []
+        with os.scandir(self._remote) as entries:
+            for entry in entries:
+                if (query_lower in entry.name.lower() and entry.is_file()
+                        and not entry.name.startswith(TOMBSTONE_PREFIX)):
+                    matches.append(self._file_metadata(entry))
+        
+        # Same order as list_files (newest first), applied to the matches only
+        matches.sort(key=lambda x: x["modified"], reverse=True)
+        return matches
+    
     def _is_allowed_file(self, filename: str) -> bool:
         """Check if file extension is allowed"""
-        return Path(filename).suffix.lower() in self.allowed_extensions
+        return _ext(filename) in self._ALLOWED_EXTS
     
-    def _create_safe_filename(self, filename: str) -> str:
-        """Create a safe filename by replacing spaces and special characters"""
+    def _create_safe_filename(self, filename: str, reserved: set) -> str:
+        """
+        Create a safe filename by replacing spaces and special characters.
+        Names already on disk or in reserved (taken earlier in the same batch) are suffixed;
+        the returned name is added to reserved.
+        """
+        def taken(candidate: str) -> bool:
+            return candidate in reserved or (self._remote / candidate).exists()
+        
         safe_name = filename.replace(" ", "_")
         # Add timestamp if file exists
-        base_path = os.path.join(REMOTE_DIR, safe_name)
-        if os.path.exists(base_path):
+        if taken(safe_name):
             name, ext = os.path.splitext(safe_name)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            safe_name = f"{name}_{timestamp}{ext}"
+            candidate = f"{name}_{timestamp}{ext}"
+            counter = 1
+            while taken(candidate):
+                candidate = f"{name}_{timestamp}_{counter}{ext}"
+                counter += 1
+            safe_name = candidate
         
+        reserved.add(safe_name)
         return safe_name
     
     def _human_readable_size(self, size_bytes: int) -> str:
         """Convert bytes to human readable format"""
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
-        return f"{size_bytes:.1f} TB"
+        if size_bytes <= 0:
+            return "0.0 B"
+        # Each unit is 2**10 of the previous one, so the bit length picks the unit directly
+        unit = min(size_bytes.bit_length() - 1, 49) // 10
+        return f"{size_bytes / (1 << (unit * 10)):.1f} {_SIZE_UNITS[unit]}"
     
-    async def _preview_pdf(self, file_path: str, page: int) -> Dict:
-        """Generate PDF preview"""
+    async def _preview_pdf(self, file_path: Path, page: int) -> Dict:
+        """Generate PDF preview, reusing the rendered page while the PDF is unchanged"""
         try:
-            doc = fitz.open(file_path)
-            if page < 1 or page > len(doc):
-                raise HTTPException(status_code=400, detail="Invalid page number")
-            
-            page_obj = doc[page - 1]
-            pix = page_obj.get_pixmap()
-            img_data = pix.tobytes("png")
-            
-            # Save preview
-            preview_filename = f"preview_{Path(file_path).stem}_page_{page}.png"
-            preview_path = os.path.join(PREVIEW_DIR, preview_filename)
+            # Previews are keyed by the PDF's mtime, so an edited file never hits a stale image
+            mtime_ns = file_path.stat().st_mtime_ns
+            preview_filename = f"preview_{file_path.stem}_{mtime_ns}_page_{page}.png"
+            preview_path = self._preview / preview_filename
             
-            with open(preview_path, "wb") as f:
-                f.write(img_data)
-            
-            doc.close()
+            total_pages = self._get_page_count(file_path, mtime_ns)
+            if total_pages is None or not preview_path.exists():
+                with fitz.open(file_path) as doc:
+                    total_pages = len(doc)
+                    self._set_page_count(file_path, mtime_ns, total_pages)
+                    if page < 1 or page > total_pages:
+                        raise HTTPException(status_code=400, detail="Invalid page number")
+                    
+                    page_obj = doc[page - 1]
+                    # Grayscale without alpha: a third of the RGB pixel data to rasterize and PNG-encode
+                    pix = page_obj.get_pixmap(matrix=fitz.Matrix(1.0, 1.0), colorspace=fitz.csGRAY, alpha=False)
+                    # Save preview through Pillow's libpng/zlib at a low level rather than PyMuPDF's default
+                    pix.pil_save(preview_path, format="PNG", compress_level=PNG_COMPRESS_LEVEL)
+                
+                self._prune_previews()
             
             return {
-                "preview_path": preview_path,
+                "preview_path": str(preview_path),
                 "page": page,
-                "total_pages": len(doc),
+                "total_pages": total_pages,
                 "preview_filename": preview_filename
             }
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"PDF preview failed: {str(e)}")
     
-    async def _preview_image(self, file_path: str) -> Dict:
+    def _get_page_count(self, file_path: Path, mtime_ns: int) -> Optional[int]:
+        """Remembered page count of a PDF, or None if unknown or the file has changed since"""
+        entry = self._page_counts.get(file_path)
+        if entry is None or entry[0] != mtime_ns:
+            return None
+        self._page_counts.move_to_end(file_path)
+        return entry[1]
+    
+    def _set_page_count(self, file_path: Path, mtime_ns: int, total_pages: int) -> None:
+        """Remember a PDF's page count, replacing any count for an older version of the file"""
+        self._page_counts[file_path] = (mtime_ns, total_pages)
+        self._page_counts.move_to_end(file_path)
+        if len(self._page_counts) > PAGE_COUNT_CACHE_MAXSIZE:
+            self._page_counts.popitem(last=False)
+    
+    def _prune_previews(self) -> None:
+        """Keep at most PREVIEW_CACHE_MAX_FILES cached PDF page previews, dropping the least recently written"""
+        with os.scandir(self._preview) as entries:
+            previews = [
+                entry for entry in entries
+                if entry.name.startswith("preview_") and entry.is_file()
+            ]
+        excess = len(previews) - PREVIEW_CACHE_MAX_FILES
+        if excess <= 0:
+            return
+        
+        previews.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in previews[:excess]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    
+    async def _preview_image(self, file_path: Path) -> Dict:
         """Generate image preview (thumbnail)"""
         try:
-            with Image.open(file_path) as img:
-                # Create thumbnail
-                img.thumbnail((800, 600), Image.Resampling.LANCZOS)
-                
-                preview_filename = f"thumb_{Path(file_path).stem}.jpg"
-                preview_path = os.path.join(PREVIEW_DIR, preview_filename)
-                
-                img.save(preview_path, "JPEG", quality=85)
-                
-                return {
-                    "preview_path": preview_path,
-                    "preview_filename": preview_filename,
-                    "original_size": os.path.getsize(file_path)
-                }
+            preview_filename = f"thumb_{file_path.stem}.jpg"
+            preview_path = self._preview / preview_filename
+            
+            # Decode/resample/encode is CPU-bound; keep it off the event loop
+            await run_in_process(_thumbnail_worker, str(file_path), str(preview_path))
+            
+            return {
+                "preview_path": str(preview_path),
+                "preview_filename": preview_filename,
+                "original_size": file_path.stat().st_size
+            }
         
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Image preview failed: {str(e)}")
     
-    async def _get_pdf_info(self, file_path: str) -> Dict:
-        """Get PDF specific information"""
+    async def _get_pdf_info(self, file_path: Path, mtime_ns: int) -> Dict:
+        """Get PDF specific information; the page count is shared with _preview_pdf"""
         try:
-            doc = fitz.open(file_path)
-            metadata = doc.metadata
+            with fitz.open(file_path) as doc:
+                metadata = doc.metadata
+                total_pages = len(doc)
+            self._set_page_count(file_path, mtime_ns, total_pages)
             
             info = {
-                "pages": len(doc),
+                "pages": total_pages,
                 "title": metadata.get("title", ""),
                 "author": metadata.get("author", ""),
                 "subject": metadata.get("subject", ""),
@@ -305,7 +568,6 @@ class FileService:
                 "modified": metadata.get("modDate", "")
             }
             
-            doc.close()
             return info
         
         except Exception:
@@ -13,6 +13,7 @@ from app.core.config import (
     KEYCLOAK_BACKEND_CLIENT_ID, 
     KEYCLOAK_BACKEND_CLIENT_SECRET
 )
+from app.core.tokens import JWKSVerifier, TokenCache
 
 
 class KeycloakService:
@@ -25,39 +26,69 @@ class KeycloakService:
             realm_name=KEYCLOAK_REALM_NAME,
             client_secret_key=KEYCLOAK_BACKEND_CLIENT_SECRET
         )
+        self._jwks_verifier = JWKSVerifier(self.keycloak_openid)
+        # Verified claims and UMA permissions, per token
+        self._token_cache = TokenCache()
+        self._permission_cache = TokenCache()
     
-    async def verify_token(self, token: str) -> tuple[Dict, list]:
-        """Verify and decode JWT token"""
+    async def verify_claims(self, token: str, introspect: bool = False) -> Dict:
+        """
+        Verify and decode JWT token, returning its claims.
+        The signature is checked locally; pass introspect=True on revocation-sensitive
+        paths to also confirm with Keycloak that the session is still active.
+        """
+        key = TokenCache.key(token)
+        if not introspect:
+            claims = self._token_cache.get(key)
+            if claims is not None:
+                # Callers annotate the claims dict, so hand out a copy
+                return dict(claims)
+        
         try:
-            # Decode and validate token
-            decoded_token = await self.keycloak_openid.a_decode_token(token, validate=True)
-            
-            # Introspect token for additional validation
-            introspection = await self.keycloak_openid.a_introspect(token)
+            # Decode and validate token against the cached realm keys
+            claims = await self._jwks_verifier.decode(token)
             
-            if not introspection.get("active"):
-                raise Exception("Token is not active")
+            if introspect:
+                # Introspect token for additional validation
+                claims = await self.keycloak_openid.a_introspect(token)
+                if not claims.get("active"):
+                    raise Exception("Token is not active")
             
             # Check expiration
-            if time.time() > introspection.get('exp', 0):
+            now = time.time()
+            if now > claims.get('exp', 0):
                 raise Exception("Token has expired")
             
-            # Get permissions
-            try:
-                auth_status = self.keycloak_openid.uma_permissions(token)
-                permissions = [
-                    perm_dict.get("rsname", "") 
-                    for perm_dict in auth_status 
-                    if "rsname" in perm_dict
-                ]
-            except Exception:
-                permissions = []
-            
-            return introspection, permissions
+            self._token_cache.put(key, claims, claims['exp'])
+            return dict(claims)
         
         except Exception as e:
             raise HTTPException(status_code=401, detail=f"Token validation failed: {str(e)}")
     
+    async def get_uma_permissions(self, token: str) -> list:
+        """Get the resource names the token is authorized for via UMA"""
+        key = TokenCache.key(token)
+        permissions = self._permission_cache.get(key)
+        if permissions is not None:
+            return list(permissions)
+        
+        try:
+            auth_status = await self.keycloak_openid.a_uma_permissions(token)
+        except Exception:
+            return []
+        
+        permissions = [
+            perm_dict["rsname"]
+            for perm_dict in auth_status
+            if "rsname" in perm_dict
+        ]
+        # Never outlive the verified claims entry for the same token
+        claims_expiry = self._token_cache.expires_at(key)
+        self._permission_cache.put(
+            key, tuple(permissions), claims_expiry if claims_expiry is not None else float("inf")
+        )
+        return permissions
+    
     async def get_user_permissions(self, user_info: Dict) -> list:
         """Get user permissions from user info"""
         try:
@@ -74,7 +105,7 @@ class KeycloakService:
             return {
                 "realm_roles": roles,
                 "client_roles": client_roles,
-                "all_roles": list(set(roles + client_roles))
+                "all_roles": list(dict.fromkeys((*roles, *client_roles)))
             }
         
         except Exception as e:
@@ -3,18 +3,37 @@ Benyon Sports API - Main Application Entry Point
 Optimized for production deployment with Docker
 """
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.core.config import CORS_ORIGINS, ENVIRONMENT, DEBUG
+from app.core.config import CORS_ORIGINS, ENVIRONMENT, DEBUG, ensure_dirs
+from app.core.executors import shutdown_process_pool
+from app.core.middleware import TextGZipMiddleware
+from app.core.logging_config import setup_logging
 from app.routers import files_clean, keycloak
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup/shutdown hooks"""
+    ensure_dirs()
+    log_listener = setup_logging()
+    # Finish backing up files whose delete was interrupted by the last shutdown
+    files_clean.file_service.recover_pending_backups()
+    yield
+    shutdown_process_pool()
+    log_listener.stop()
+
 # Create FastAPI application instance
 app = FastAPI(
     title="Benyon Sports API",
     version="1.0.0",
     description="Backend API for Benyon Sports file management system",
-    debug=DEBUG
+    debug=DEBUG,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Configure CORS middleware
@@ -26,6 +45,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress text responses (JSON listings, sheet HTML) when the client accepts gzip; files pass through
+app.add_middleware(TextGZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # Include routers
 app.include_router(files_clean.router, prefix="/api/files", tags=["files"])
 app.include_router(keycloak.router, prefix="/api/auth", tags=["authentication"])
@@ -48,11 +70,15 @@ async def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    from app.core.config import PORT
+    from app.core.config import PORT, WEB_CONCURRENCY
     
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=PORT,
-        reload=DEBUG
+        reload=DEBUG,
+        workers=1 if DEBUG else WEB_CONCURRENCY,
+        loop="auto",
+        http="httptools",
+        limit_concurrency=1024
     )